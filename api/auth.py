@@ -1,5 +1,7 @@
 import os
+import asyncio
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from typing import Annotated
 
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
@@ -10,9 +12,12 @@ from fastapi import status, HTTPException, Depends
 from fastapi.routing import APIRouter
 
 from pydantic import BaseModel
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import object_session
 from sqlmodel import select
 
-from database import SessionDep, User
+from database import SessionDep, User, on_commit
+from cache import TTLCache
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -23,9 +28,22 @@ ACCESS_TOKEN_EXP_DAYS = 7
 SECRET_KEY = os.environ.get("SECRET_KEY")
 ALGORITHM = "HS256"
 
+# bcrypt is CPU bound; it runs on a small dedicated pool so a burst of logins cannot starve the event loop.
+PASSWD_WORKERS = int(os.environ.get("PASSWD_WORKERS", 2))
+PASSWD_QUEUE_SIZE = int(os.environ.get("PASSWD_QUEUE_SIZE", 32))
+PASSWD_TIMEOUT = float(os.environ.get("PASSWD_TIMEOUT", 5))
+
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10_000))
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 60))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+passwd_executor = ThreadPoolExecutor(max_workers=PASSWD_WORKERS, thread_name_prefix="passwd")
+passwd_slots = asyncio.Semaphore(PASSWD_WORKERS + PASSWD_QUEUE_SIZE)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
+# Token subject (username) -> resolved User, so polling clients skip the lookup query.
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
 # ----------------------------------------- MODELS -----------------------------------------
 
 class SignUpRequest(BaseModel):
@@ -42,25 +60,64 @@ class TokenData(BaseModel):
 
 # ----------------------------------------- HELPER FUNCTIONS -----------------------------------------
 
-def verify_passwd(plain_passwd, hashed_passwd):
-    return pwd_context.verify(plain_passwd, hashed_passwd)
+async def run_passwd_job(fn, *args):
+    busy_exception = HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-in requests, please retry shortly.",
+        headers={"Retry-After" : "1"},
+    )
+    if passwd_slots.locked():
+        raise busy_exception
+    await passwd_slots.acquire()
+    loop = asyncio.get_running_loop()
+
+    def job():
+        # The slot is held until bcrypt is really done, even when the caller already gave up waiting.
+        try:
+            return fn(*args)
+        finally:
+            loop.call_soon_threadsafe(passwd_slots.release)
+
+    future = passwd_executor.submit(job)
+    # A job cancelled before it started never runs, so its slot is released here instead.
+    future.add_done_callback(lambda done: done.cancelled() and loop.call_soon_threadsafe(passwd_slots.release))
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), PASSWD_TIMEOUT)
+    except TimeoutError:
+        raise busy_exception
+
+async def verify_passwd(plain_passwd, hashed_passwd):
+    return await run_passwd_job(pwd_context.verify, plain_passwd, hashed_passwd)
 
-def get_passwd_hash(passwd):
-    return pwd_context.hash(passwd)
+async def get_passwd_hash(passwd):
+    return await run_passwd_job(pwd_context.hash, passwd)
 
-def get_user(session: SessionDep, username: str) -> User:
-    user = session.exec(select(User).where(User.username == username)).first()
+async def get_user(session: SessionDep, username: str) -> User:
+    user = (await session.exec(select(User).where(User.username == username))).first()
     if user:
         return user
     
-def authenticate_user(session: SessionDep, username: str, password: str):
-    user = get_user(session, username)
+async def authenticate_user(session: SessionDep, username: str, password: str):
+    user = await get_user(session, username)
     if not user:
         return False
-    if not verify_passwd(password, user.hashed_passwd):
+    # Ends the read so its connection goes back to the pool while bcrypt runs: waiting logins must not exhaust it.
+    await session.commit()
+    if not await verify_passwd(password, user.hashed_passwd):
         return False
     return user
 
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def invalidate_cached_user(mapper, connection, target: User):
+    # A rename leaves the old subject behind; tokens issued for it must not resolve anymore.
+    usernames = [target.username, *inspect(target).attrs.username.history.deleted]
+    # Dropped once committed: a request between the flush and the commit would cache the old row again.
+    def invalidate():
+        for username in usernames:
+            user_cache.pop(username)
+    on_commit(object_session(target), invalidate)
+
 def create_access_token(data: dict, expires_delta: datetime.timedelta = datetime.timedelta(days=ACCESS_TOKEN_EXP_DAYS)):
     to_encode = data.copy()
     expire = datetime.datetime.now(datetime.UTC) + expires_delta
@@ -82,9 +139,12 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], sessio
         token_data = TokenData(username=username)
     except InvalidTokenError:
         raise credentials_exception
-    user = get_user(session, username=token_data.username)
+    user = user_cache.get(token_data.username)
     if user is None:
-        raise credentials_exception
+        user = await get_user(session, username=token_data.username)
+        if user is None:
+            raise credentials_exception
+        user_cache.set(token_data.username, user)
     return user
 
 async def get_current_active_user(current_user: Annotated[User, Depends(get_current_user)]) -> User:
@@ -98,16 +158,16 @@ auth_router = APIRouter(prefix="/auth", tags=["Auth"])
 
 @auth_router.post("/signup")
 async def create_user(request: SignUpRequest, session: SessionDep) -> User:
-    conflict = session.exec(select(User).where(
+    conflict = (await session.exec(select(User).where(
         User.username == request.username
-        or User.email == request.email)).first()
+        or User.email == request.email))).first()
     if conflict is not None:
         if conflict.email == request.email:
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Email {request.username} is already in use.")
         if conflict.username == request.username:
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"User {request.username} already exists.")
         
-    hashed_password = pwd_context.hash(request.password)
+    hashed_password = await get_passwd_hash(request.password)
     now = datetime.datetime.now(datetime.UTC)
     user = User(
         id=None,
@@ -121,13 +181,17 @@ async def create_user(request: SignUpRequest, session: SessionDep) -> User:
     )
 
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
     return user
 
+@auth_router.get("/cache-stats")
+async def read_user_cache_stats() -> dict[str, int | float]:
+    return user_cache.stats()
+
 @auth_router.post("/token")
 async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], session: SessionDep) -> Token:
-    user = authenticate_user(session, form_data.username, form_data.password)
+    user = await authenticate_user(session, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,117 @@
+import os
+import json
+import hashlib
+from functools import cache
+
+import numpy as np
+
+# ----------------------------------------- CONFIG -----------------------------------------
+
+BENCHMARKS_FILE = os.environ.get("BENCHMARKS_FILE", os.path.join(os.path.dirname(__file__), "data", "benchmarks.json"))
+
+# ----------------------------------------- ENERGY TABLES -----------------------------------------
+
+class EnergyTable:
+    """Piecewise-linear score -> energy mapping of one benchmark, evaluated on arrays.
+
+    Same formula as the dashboard's Benchmark.get_energy, compiled into per-scenario tables.
+    """
+
+    def __init__(self, thresholds: dict[str, tuple[int, int, int, int]], energy_thresholds: tuple[int, int, int, int]):
+        e1, e2, e3, e4 = energy_thresholds
+        previous_energy = e1 - 100
+        self.max_energy = e4 + 99
+        self.hashes = list(thresholds.keys())
+        self.index = {hash_ : i for i, hash_ in enumerate(self.hashes)}
+
+        n_hashes, width = len(self.hashes), 6
+        self.match = np.full((n_hashes, width), np.nan)
+        self.base, self.anchor, self.denominator, self.factor = (np.zeros((n_hashes, width + 1)) for _ in range(4))
+        for h, (t1, t2, t3, t4) in enumerate(thresholds.values()):
+            if e1 == 100: # Novice
+                match_array = [0, t1, t2, t3, t4]
+                base = [previous_energy, e1, e2, e3, e4]
+                denominator = [t1, t2 - t1, t3 - t2, t4 - t3, t4 - t3]
+                factor = [e1, e2 - e1, e3 - e2, e4 - e3, e4 - e3]
+            else: # Intermediate and Advanced
+                match_array = [0, t1 - (t2 - t1), t1, t2, t3, t4]
+                base = [0, previous_energy, e1, e2, e3, e4]
+                denominator = [t1 - (t2 - t1), t2 - t1, t2 - t1, t3 - t2, t4 - t3, t4 - t3]
+                factor = [previous_energy, e1 - previous_energy, e2 - e1, e3 - e2, e4 - e3, e4 - e3]
+            n = len(match_array)
+            self.match[h, :n] = match_array
+            self.base[h, 1:n + 1] = base
+            self.anchor[h, 1:n + 1] = match_array
+            self.denominator[h, 1:n + 1] = denominator
+            self.factor[h, 1:n + 1] = factor
+
+    def energies(self, scores, codes) -> np.ndarray:
+        scores = np.asarray(scores, dtype=float)
+        codes = np.asarray(codes, dtype=np.intp)
+        match_idx = np.zeros(scores.shape, dtype=np.intp)
+        matching = np.ones(scores.shape, dtype=bool)
+        for column in range(self.match.shape[1]):
+            matching &= self.match[codes, column] <= scores
+            match_idx += matching
+        denominator = self.denominator[codes, match_idx]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result = self.base[codes, match_idx] + ((scores - self.anchor[codes, match_idx]) / denominator) * self.factor[codes, match_idx]
+        result = np.where(result > self.max_energy, self.max_energy, result)
+        return np.where((match_idx == 0) | (denominator == 0), 0.0, result)
+
+# ----------------------------------------- REGISTRY -----------------------------------------
+
+class Benchmark:
+    """One difficulty of one season of a benchmark family, compiled for lookups.
+
+    Scenarios keep the order of the data file: consecutive pairs form the categories.
+    """
+
+    def __init__(self, family: str, season: int, difficulty: str, categories: list[str], spec: dict):
+        self.family = family
+        self.season = season
+        self.difficulty = difficulty
+        self.key = family, season, difficulty
+        self.version = hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:12]
+        self.energy_thresholds: tuple[int, int, int, int] = tuple(spec["energy_thresholds"])
+        self.names = [scenario["name"] for scenario in spec["scenarios"]]
+        self.hashes = [scenario["hash"] for scenario in spec["scenarios"]]
+        self.thresholds: dict[str, tuple[int, int, int, int]] = {scenario["hash"] : tuple(scenario["thresholds"]) for scenario in spec["scenarios"]}
+        self.index = {hash_ : i for i, hash_ in enumerate(self.hashes)}
+        if len(self.hashes) != 2 * len(categories):
+            raise ValueError(f"{family} season {season} {difficulty}: {len(self.hashes)} scenarios for {len(categories)} categories.")
+        self.categories = [(name, (self.hashes[2 * i], self.hashes[2 * i + 1])) for i, name in enumerate(categories)]
+        self.energy_table = EnergyTable(self.thresholds, self.energy_thresholds)
+
+    def overall_energies(self, scores: np.ndarray) -> np.ndarray:
+        """Overall energy of each row of a (players, scenarios) matrix of bests in `hashes` order.
+
+        NaN marks an unplayed scenario; rows missing a whole category get NaN.
+        """
+        codes = np.arange(len(self.hashes))
+        energies = np.where(np.isnan(scores), np.nan, self.energy_table.energies(np.nan_to_num(scores), codes))
+        pairs = np.array([[self.index[hash_] for hash_ in hashes] for _, hashes in self.categories])
+        categories = np.fmax(energies[..., pairs[:, 0]], energies[..., pairs[:, 1]])
+        # A zero category energy makes the harmonic mean zero.
+        with np.errstate(divide="ignore"):
+            return len(self.categories) / np.sum(1.0 / categories, axis=-1)
+
+@cache
+def load_registry(path: str = BENCHMARKS_FILE) -> dict[tuple[str, int, str], Benchmark]:
+    with open(path) as file:
+        data = json.load(file)
+    return {
+        (family, int(season), difficulty) : Benchmark(family, int(season), difficulty, spec["categories"], difficulty_spec)
+        for family, spec in data.items()
+        for season, difficulties in spec["seasons"].items()
+        for difficulty, difficulty_spec in difficulties.items()
+    }
+
+def find_benchmark(family: str, season: int, difficulty: str) -> Benchmark | None:
+    return load_registry().get((family, season, difficulty))
+
+def all_benchmarks() -> list[Benchmark]:
+    return list(load_registry().values())
+
+def has_season(family: str, season: int) -> bool:
+    return any(key[:2] == (family, season) for key in load_registry())
@@ -0,0 +1,211 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+try:
+    import redis.asyncio as redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire `ttl` seconds after being stored.
+
+    With `maxbytes`, values must be bytes and their total length is bounded too.
+    Meant to be used from the event loop only, so it does no locking.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, maxbytes: int | None = None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _weight(self, value: Any) -> int:
+        return len(value) if self.maxbytes is not None else 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.nbytes -= self._weight(value)
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self.pop(key)
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self.nbytes += self._weight(value)
+        while len(self._data) > self.maxsize or (self.maxbytes is not None and self.nbytes > self.maxbytes):
+            _, (_, evicted) = self._data.popitem(last=False)
+            self.nbytes -= self._weight(evicted)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.pop(key, None)
+        if item is None:
+            return default
+        self.nbytes -= self._weight(item[1])
+        return item[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.nbytes = 0
+
+    def stats(self) -> dict[str, int | float]:
+        lookups = self.hits + self.misses
+        return {
+            "size" : len(self._data),
+            "maxsize" : self.maxsize,
+            "bytes" : self.nbytes,
+            "hits" : self.hits,
+            "misses" : self.misses,
+            "evictions" : self.evictions,
+            "hit_rate" : self.hits / lookups if lookups else 0.0,
+        }
+
+class LocalBackend:
+    """In-process LRU backend for ResponseCache, bounded in entries and in bytes."""
+
+    def __init__(self, maxsize: int, ttl: float, maxbytes: int):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl, maxbytes=maxbytes)
+
+    async def get(self, key: str) -> bytes | None:
+        return self.entries.get(key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        self.entries.set(key, value)
+
+    def discard(self, key: str) -> None:
+        self.entries.pop(key)
+
+class RedisBackend:
+    """Backend shared by every worker, on any server speaking the Redis protocol."""
+
+    def __init__(self, url: str, ttl: float, prefix: str = "aimalytics:"):
+        if redis is None:
+            raise RuntimeError("A Redis cache URL needs the `redis` package.")
+        self.client = redis.from_url(url)
+        self.ttl_ms = max(1, int(ttl * 1000))
+        self.prefix = prefix
+        self.tasks: set[asyncio.Task] = set()
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        await self.client.set(self.prefix + key, value, px=self.ttl_ms)
+
+    def discard(self, key: str) -> None:
+        # Called from synchronous ORM events: the delete runs as its own task.
+        try:
+            task = asyncio.get_running_loop().create_task(self.client.delete(self.prefix + key))
+        except RuntimeError:
+            return
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+class ResponseCache:
+    """Serialized results keyed by route and parameters, computed once per key at a time.
+
+    Keys carry the versions of the data they depend on (a user's sync revision, a snapshot
+    version), so new data is a new key and superseded entries age out of the backend.
+    Concurrent misses on one key wait for the first computation instead of repeating it; if that
+    request is cancelled, a waiter takes over.
+    A failing backend degrades to recomputing. Values over `max_entry_bytes` are served but not stored.
+    """
+
+    def __init__(self, backend: LocalBackend | RedisBackend, max_entry_bytes: int):
+        self.backend = backend
+        self.max_entry_bytes = max_entry_bytes
+        self.inflight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.oversized = 0
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[bytes]]) -> bytes:
+        try:
+            value = await self.backend.get(key)
+        except Exception:
+            logger.exception("Reading the response cache failed")
+            self.errors += 1
+            value = None
+        if value is not None:
+            self.hits += 1
+            return value
+
+        future = self.inflight.get(key)
+        while future is not None:
+            try:
+                value = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # A cancelled leader leaves no result: unless this request was cancelled too,
+                # it waits for whoever took over or computes the value itself.
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                future = self.inflight.get(key)
+            else:
+                self.coalesced += 1
+                return value
+
+        self.misses += 1
+        future = self.inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception() # Retrieved: waiters are optional.
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            del self.inflight[key]
+
+        if len(value) > self.max_entry_bytes:
+            self.oversized += 1
+            return value
+        try:
+            await self.backend.set(key, value)
+        except Exception:
+            logger.exception("Writing the response cache failed")
+            self.errors += 1
+        return value
+
+    def invalidate(self, key: str) -> None:
+        self.backend.discard(key)
+
+    def stats(self) -> dict[str, int | float]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "backend" : type(self.backend).__name__,
+            "hits" : self.hits,
+            "misses" : self.misses,
+            "coalesced" : self.coalesced,
+            "errors" : self.errors,
+            "oversized" : self.oversized,
+            "inflight" : len(self.inflight),
+            "hit_rate" : (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
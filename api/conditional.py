@@ -0,0 +1,46 @@
+import hashlib
+import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, status
+from fastapi.responses import Response
+
+# ----------------------------------------- HELPER FUNCTIONS -----------------------------------------
+
+def entity_tag(*parts) -> str:
+    # Weak: the same representation may be sent gzip or brotli encoded.
+    return 'W/"' + hashlib.sha1("\x1f".join(map(str, parts)).encode()).hexdigest()[:20] + '"'
+
+def as_utc(moment: datetime.datetime) -> datetime.datetime:
+    # SQLite hands timestamps back without their zone; they are stored in UTC.
+    return moment.replace(tzinfo=datetime.UTC) if moment.tzinfo is None else moment.astimezone(datetime.UTC)
+
+def validator_headers(etag: str, last_modified: datetime.datetime | None, private: bool = True) -> dict[str, str]:
+    headers = {"ETag" : etag, "Cache-Control" : f"{'private' if private else 'public'}, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(as_utc(last_modified), usegmt=True)
+    return headers
+
+def is_fresh(request: Request, etag: str, last_modified: datetime.datetime | None) -> bool:
+    """Whether the client's copy is current; If-None-Match takes precedence over If-Modified-Since."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return as_utc(last_modified).replace(microsecond=0) <= as_utc(since)
+
+def not_modified(request: Request, etag: str, last_modified: datetime.datetime | None, private: bool = True) -> Response | None:
+    """A bodiless 304 when the request's validators match, so the caller can skip building the body."""
+    if not is_fresh(request, etag, last_modified):
+        return None
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=validator_headers(etag, last_modified, private))
+
+def set_validators(response: Response, etag: str, last_modified: datetime.datetime | None, private: bool = True) -> None:
+    response.headers.update(validator_headers(etag, last_modified, private))
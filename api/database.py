@@ -3,15 +3,45 @@ import datetime
 from typing import Annotated
 
 from fastapi import Depends
-from sqlmodel import SQLModel, Field, create_engine, Session
+from sqlalchemy import BigInteger, DateTime, Index, UniqueConstraint, func, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session
+from sqlmodel import SQLModel, Field, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from dotenv import load_dotenv
 load_dotenv()
 
 DATABASE_URL = os.environ.get("DATABASE_URL")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
 
-CONNECT_ARGS = {}#{"check_same_thread" : False}
-engine = create_engine(DATABASE_URL, connect_args=CONNECT_ARGS)
+# Plain URLs (as handed out by hosting providers) get mapped onto their async driver.
+ASYNC_DRIVERS = {
+    "postgres" : "postgresql+asyncpg",
+    "postgresql" : "postgresql+asyncpg",
+    "postgresql+psycopg2" : "postgresql+asyncpg",
+    "sqlite" : "sqlite+aiosqlite",
+    "sqlite+pysqlite" : "sqlite+aiosqlite",
+}
+
+def async_database_url(database_url: str) -> URL:
+    url = make_url(database_url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+def engine_options(url: URL) -> dict:
+    options = {"pool_pre_ping" : DB_POOL_PRE_PING, "pool_recycle" : DB_POOL_RECYCLE}
+    # SQLite pools per file (or a single static connection in memory), so sizing does not apply.
+    if url.get_backend_name() != "sqlite":
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+    return options
+
+DATABASE_ASYNC_URL = async_database_url(DATABASE_URL)
+engine = create_async_engine(DATABASE_ASYNC_URL, **engine_options(DATABASE_ASYNC_URL))
 
 class User(SQLModel, table=True):
     id: int = Field(None, primary_key=True)
@@ -24,24 +54,140 @@ class User(SQLModel, table=True):
     created_at: datetime.datetime = Field(None)
     updated_at: datetime.datetime = Field(None)
 
+class Scenario(SQLModel, table=True):
+    id: int = Field(None, primary_key=True)
+    name: str | None = Field(None)
+    hash: str = Field(unique=True)
+
+class SettingsProfile(SQLModel, table=True):
+    __table_args__ = (UniqueConstraint("sens_scale", "sens_increment", "dpi", "fov_scale", "fov"),)
+
+    id: int = Field(None, primary_key=True)
+    sens_scale: str | None = Field(None)
+    sens_increment: float | None = Field(None)
+    dpi: int | None = Field(None)
+    fov_scale: str | None = Field(None)
+    fov: int | None = Field(None)
+
+# Runs are stored narrow: the scenario and the sensitivity/FOV settings are interned into the
+# tables above and referenced by id. EntryBase is the wide shape clients send and receive.
+class EntryBase(SQLModel):
+    scenario: str | None = Field(None)
+    hash: str = Field(min_length=1)
+    score: float = Field(schema_extra={"allow_inf_nan" : False})
+    ctime: int = Field(ge=0) # Nanoseconds since the epoch
+    sens_scale: str | None = Field(None)
+    sens_increment: float | None = Field(None)
+    dpi: int | None = Field(None)
+    fov_scale: str | None = Field(None)
+    fov: int | None = Field(None)
+
+class EntryPublic(EntryBase):
+    id: int
+    user_id: int | None
+
 class Entry(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_entry_user_id_scenario_id_ctime", "user_id", "scenario_id", "ctime"),
+        Index("ix_entry_user_id_ctime", "user_id", "ctime"),
+        Index("ix_entry_scenario_id", "scenario_id"),
+    )
+
     id: int = Field(None, primary_key=True)
     user_id: int | None = Field(None, foreign_key="user.id")
-    scenario: str = Field(None)
-    hash: str = Field(index=True)
-    score: float = Field(None)
-    ctime: str = Field(None, index=True)
-    sens_scale: str = Field(None)
-    sens_increment: float = Field(None)
-    dpi: int = Field(None)
-    fov_scale: str = Field(None)
-    fov: int = Field(None)
-
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
-
-def get_session():
-    with Session(engine) as session:
+    scenario_id: int = Field(foreign_key="scenario.id")
+    settings_id: int | None = Field(None, foreign_key="settingsprofile.id")
+    score: float
+    ctime: int = Field(sa_type=BigInteger) # Nanoseconds since the epoch
+
+# Best score of a user on a scenario per (UTC) day, maintained by ingest alongside Entry.
+class DailyBest(SQLModel, table=True):
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    scenario_id: int = Field(primary_key=True, foreign_key="scenario.id")
+    day: datetime.date = Field(primary_key=True)
+    score: float
+
+# Best score of a user on a scenario, maintained by ingest. Feeds the scenario sketches.
+class ScenarioBest(SQLModel, table=True):
+    __table_args__ = (Index("ix_scenariobest_scenario_id_score", "scenario_id", "score"),)
+
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    scenario_id: int = Field(primary_key=True, foreign_key="scenario.id")
+    score: float
+    ctime: int | None = Field(None, sa_type=BigInteger)
+
+# Serialized t-digest (see sketch.py) over the ScenarioBest scores of one scenario.
+class ScenarioSketch(SQLModel, table=True):
+    scenario_id: int = Field(primary_key=True, foreign_key="scenario.id")
+    digest: bytes
+    users: int = Field(0)
+    stale: int = Field(0) # Superseded bests still counted in the digest
+    updated_at: datetime.datetime = Field(None)
+
+# Newest run ctime stored for a user, overall and per scenario; what trackers sync from.
+# `revision` and `updated_at` change with every insert and validate cached reads of the user's runs.
+class SyncWatermark(SQLModel, table=True):
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    ctime: int = Field(0, sa_type=BigInteger)
+    revision: int = Field(0, sa_column_kwargs={"server_default" : "0"})
+    updated_at: datetime.datetime | None = Field(None, sa_type=DateTime(timezone=True))
+
+class ScenarioWatermark(SQLModel, table=True):
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    scenario_id: int = Field(primary_key=True, foreign_key="scenario.id")
+    ctime: int = Field(0, sa_type=BigInteger)
+
+def select_public_entries():
+    return (
+        select(
+            Entry.id,
+            Entry.user_id,
+            Scenario.name.label("scenario"),
+            Scenario.hash,
+            Entry.score,
+            Entry.ctime,
+            SettingsProfile.sens_scale,
+            SettingsProfile.sens_increment,
+            SettingsProfile.dpi,
+            SettingsProfile.fov_scale,
+            SettingsProfile.fov,
+        )
+        .join(Scenario, Entry.scenario_id == Scenario.id)
+        .outerjoin(SettingsProfile, Entry.settings_id == SettingsProfile.id)
+    )
+
+DIALECT_INSERTS = {"postgresql" : postgresql.insert, "sqlite" : sqlite.insert}
+
+def dialect_insert(table):
+    # INSERT supporting ON CONFLICT for the configured backend.
+    return DIALECT_INSERTS[engine.dialect.name](table)
+
+def greatest(*args):
+    # SQLite spells GREATEST as the multi-argument MAX.
+    return func.greatest(*args) if engine.dialect.name == "postgresql" else func.max(*args)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+def on_commit(session: AsyncSession | Session, hook) -> None:
+    # Runs `hook` once the session's current transaction commits; dropped on rollback.
+    sync_session = session.sync_session if isinstance(session, AsyncSession) else session
+    sync_session.info.setdefault("on_commit", []).append(hook)
+
+@event.listens_for(Session, "after_commit")
+def run_commit_hooks(session: Session):
+    for hook in session.info.pop("on_commit", []):
+        hook()
+
+@event.listens_for(Session, "after_rollback")
+def drop_commit_hooks(session: Session):
+    session.info.pop("on_commit", None)
+
+async def get_session():
+    # expire_on_commit=False: attributes of committed objects are read after the commit,
+    # and an async session cannot lazily reload them.
+    async with AsyncSession(engine, expire_on_commit=False) as session:
         yield session
 
-SessionDep = Annotated[Session, Depends(get_session)]
\ No newline at end of file
+SessionDep = Annotated[AsyncSession, Depends(get_session)]
\ No newline at end of file
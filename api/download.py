@@ -1,20 +1,84 @@
 import os
+import asyncio
+import hashlib
+import datetime
+from functools import cache
 
+from fastapi import Request, status
 from fastapi.exceptions import HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse
 from fastapi.routing import APIRouter
 
+from pydantic import BaseModel
 
+from conditional import not_modified
+
+# ----------------------------------------- CONFIG -----------------------------------------
+
+BIN_DIR = os.environ.get("BIN_DIR", os.path.join(os.path.dirname(__file__), "bin"))
+TRACKER_FILENAME = "kovaaks_tracker.exe"
+# Reported by the manifest; defaults to a prefix of the binary's SHA-256.
+TRACKER_VERSION = os.environ.get("TRACKER_VERSION")
+
+# ----------------------------------------- MODELS -----------------------------------------
+
+class Manifest(BaseModel):
+    filename: str
+    version: str
+    size: int
+    sha256: str
+    modified_at: datetime.datetime
+    url: str
+
+# ----------------------------------------- HELPER FUNCTIONS -----------------------------------------
+
+@cache
+def file_sha256(path: str, size: int, mtime_ns: int) -> str:
+    # Keyed by size and mtime as well, so a replaced binary is hashed again.
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+async def stat_binary(filename: str) -> tuple[str, os.stat_result, str]:
+    path = os.path.join(BIN_DIR, filename)
+    try:
+        stat = await asyncio.to_thread(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail=f"{filename} is not available.")
+    sha256 = await asyncio.to_thread(file_sha256, path, stat.st_size, stat.st_mtime_ns)
+    return path, stat, sha256
+
+# ----------------------------------------- ENDPOINTS -----------------------------------------
 
 download_router = APIRouter(prefix="/download", tags=["Download"])
 
-@download_router.get("/kovaaks_tracker.exe")
-async def download_binary():
-    filename = "kovaaks_tracker.exe"
-    file_path = os.path.join("api/bin", filename)
+@download_router.get("/manifest")
+async def get_manifest(request: Request) -> Manifest:
+    _, stat, sha256 = await stat_binary(TRACKER_FILENAME)
+    return Manifest(
+        filename=TRACKER_FILENAME,
+        version=TRACKER_VERSION or sha256[:12],
+        size=stat.st_size,
+        sha256=sha256,
+        modified_at=datetime.datetime.fromtimestamp(stat.st_mtime, datetime.UTC),
+        url=str(request.url_for("download_binary")),
+    )
 
-    if os.path.exists(file_path):
-        file_like = open(file_path, mode="rb")
-        return StreamingResponse(file_like, media_type="application/octet-stream")
-    else:
-        raise HTTPException(status_code=404)
\ No newline at end of file
+@download_router.api_route("/kovaaks_tracker.exe", methods=["GET", "HEAD"])
+async def download_binary(request: Request):
+    # FileResponse sends Content-Length, serves Range/If-Range requests (206) and uses the
+    # server's zero-copy file sending when it has one; the file is opened and closed per request.
+    path, stat, sha256 = await stat_binary(TRACKER_FILENAME)
+    etag = f'"{sha256}"'
+    modified_at = datetime.datetime.fromtimestamp(stat.st_mtime, datetime.UTC)
+    if (response := not_modified(request, etag, modified_at, private=False)) is not None:
+        return response
+    return FileResponse(
+        path,
+        media_type="application/octet-stream",
+        filename=TRACKER_FILENAME,
+        stat_result=stat,
+        headers={"ETag" : etag, "Cache-Control" : "public, no-cache"},
+    )
@@ -0,0 +1,105 @@
+import json
+from typing import AsyncIterator, Literal
+
+from fastapi import status
+from fastapi.exceptions import HTTPException
+from fastapi.responses import Response, StreamingResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# ----------------------------------------- CONFIG -----------------------------------------
+
+COLUMNS_MEDIA_TYPE = "application/vnd.aimalytics.columns+json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Repeated strings travel once per distinct value, plus an integer code per row (-1 for null).
+DICTIONARY_COLUMNS = {"scenario", "hash", "sens_scale", "fov_scale"}
+
+ResponseFormat = Literal["rows", "columns", "arrow", "ndjson"]
+
+# ----------------------------------------- HELPER FUNCTIONS -----------------------------------------
+
+def dumps(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+def negotiate_format(format: ResponseFormat | None, accept: str | None) -> ResponseFormat:
+    # An explicit ?format= wins over the Accept header.
+    if format is not None:
+        return format
+    if accept is not None and ARROW_MEDIA_TYPE in accept:
+        return "arrow"
+    if accept is not None and COLUMNS_MEDIA_TYPE in accept:
+        return "columns"
+    if accept is not None and NDJSON_MEDIA_TYPE in accept:
+        return "ndjson"
+    return "rows"
+
+def project_columns(query, fields: str | None):
+    """Restricts a select to the comma-separated `fields`, in the requested order."""
+    if fields is None:
+        return query
+    selected = {column.key : column for column in query.selected_columns}
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in selected]
+    available = ", ".join(selected)
+    if not names:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=f"No fields given in {fields!r}. Available: {available}.")
+    if unknown:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(unknown)}. Available: {available}.")
+    return query.with_only_columns(*(selected[name] for name in names))
+
+def encode_columns(names: list[str], rows: list[tuple], meta: dict) -> dict:
+    columns, dictionaries = {}, {}
+    for name, values in zip(names, zip(*rows) if rows else [()] * len(names)):
+        if name in DICTIONARY_COLUMNS:
+            index = {}
+            columns[name] = [-1 if value is None else index.setdefault(value, len(index)) for value in values]
+            dictionaries[name] = list(index)
+        else:
+            columns[name] = list(values)
+    return {"length" : len(rows), "columns" : columns, "dictionaries" : dictionaries, **meta}
+
+def encode_arrow(names: list[str], rows: list[tuple], meta: dict) -> bytes:
+    arrays = []
+    for name, values in zip(names, zip(*rows) if rows else [()] * len(names)):
+        array = pa.array(values)
+        arrays.append(array.dictionary_encode() if name in DICTIONARY_COLUMNS else array)
+    table = pa.Table.from_arrays(arrays, names=names).replace_schema_metadata({key : json.dumps(value) for key, value in meta.items()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def encoded_response(format: ResponseFormat, names: list[str], rows: list[tuple], meta: dict) -> Response:
+    """Encodes query rows as row objects under "entries", as columns, or as an Arrow IPC stream.
+
+    `meta` holds the response's other top-level fields (Arrow puts them in the schema metadata).
+    """
+    headers = {"Vary" : "Accept"}
+    if format == "arrow":
+        if pa is None:
+            raise HTTPException(status.HTTP_406_NOT_ACCEPTABLE, detail="Arrow responses are not available on this server.")
+        return Response(encode_arrow(names, rows, meta), media_type=ARROW_MEDIA_TYPE, headers=headers)
+    if format == "columns":
+        return Response(dumps(encode_columns(names, rows, meta)), media_type=COLUMNS_MEDIA_TYPE, headers=headers)
+    payload = {"entries" : [dict(zip(names, row)) for row in rows], **meta}
+    return Response(dumps(payload), media_type="application/json", headers=headers)
+
+def ndjson_response(names: list[str], partitions: AsyncIterator[list[tuple]], meta: dict) -> StreamingResponse:
+    """Streams one JSON object per row, after a first line holding `meta`; memory stays at one partition."""
+    async def lines():
+        yield dumps(meta) + b"\n"
+        async for rows in partitions:
+            yield b"".join(dumps(dict(zip(names, row))) + b"\n" for row in rows)
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE, headers={"Vary" : "Accept"})
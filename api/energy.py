@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+from pydantic import BaseModel
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import Scenario, ScenarioBest, SyncWatermark
+from cache import TTLCache
+from benchmarks import Benchmark
+
+# ----------------------------------------- CONFIG -----------------------------------------
+
+ENERGY_CACHE_SIZE = int(os.environ.get("ENERGY_CACHE_SIZE", 10_000))
+ENERGY_CACHE_TTL = float(os.environ.get("ENERGY_CACHE_TTL", 3600))
+
+# (user_id, sync revision) -> {(family, season, difficulty): BenchmarkEnergy}. Every insert bumps the
+# revision in the database, so each worker misses on its next read and older entries age out.
+energy_cache = TTLCache(maxsize=ENERGY_CACHE_SIZE, ttl=ENERGY_CACHE_TTL)
+
+# ----------------------------------------- MODELS -----------------------------------------
+
+class CategoryEnergy(BaseModel):
+    name: str
+    hashes: tuple[str, str]
+    energy: float | None
+
+class BenchmarkEnergy(BaseModel):
+    season: int
+    difficulty: str
+    scenarios: dict[str, float | None]
+    categories: list[CategoryEnergy]
+    energy: float | None
+
+# ----------------------------------------- HELPER FUNCTIONS -----------------------------------------
+
+def harmonic_mean(values: np.ndarray) -> float:
+    return 0.0 if (values <= 0).any() else float(len(values) / np.sum(1.0 / values))
+
+async def get_benchmark_energy(session: AsyncSession, user_id: int, benchmark: Benchmark) -> BenchmarkEnergy:
+    watermark = await session.get(SyncWatermark, user_id)
+    key = (user_id, watermark.revision if watermark is not None else 0)
+    per_user = energy_cache.get(key)
+    if per_user is not None and benchmark.key in per_user:
+        return per_user[benchmark.key]
+
+    table = benchmark.energy_table
+    query = (
+        select(Scenario.hash, ScenarioBest.score)
+        .join(Scenario, ScenarioBest.scenario_id == Scenario.id)
+        .where(ScenarioBest.user_id == user_id)
+        .where(Scenario.hash.in_(table.hashes))
+    )
+    best = dict((await session.exec(query)).all())
+
+    # The energy of a scenario's all-time best is the highest energy it ever reached, which is
+    # what the dashboard's daily-max / cummax pipeline ends up with.
+    scores = np.array([best.get(hash_, np.nan) for hash_ in table.hashes])
+    energies = table.energies(scores, np.arange(len(table.hashes)))
+    played = ~np.isnan(scores)
+
+    categories = []
+    for name, hashes in benchmark.categories:
+        pair = [table.index[hash_] for hash_ in hashes]
+        energy = float(energies[pair][played[pair]].max()) if played[pair].any() else None
+        categories.append(CategoryEnergy(name=name, hashes=hashes, energy=energy))
+
+    category_energies = [category.energy for category in categories]
+    result = BenchmarkEnergy(
+        season=benchmark.season,
+        difficulty=benchmark.difficulty,
+        scenarios={hash_ : float(energy) if is_played else None for hash_, energy, is_played in zip(table.hashes, energies, played)},
+        categories=categories,
+        energy=None if None in category_energies else harmonic_mean(np.array(category_energies)),
+    )
+    per_user = energy_cache.get(key) or {}
+    per_user[benchmark.key] = result
+    energy_cache.set(key, per_user)
+    return result
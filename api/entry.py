@@ -1,65 +1,96 @@
-from datetime import datetime, timedelta
+import base64
+import binascii
+from datetime import date, datetime, timedelta
 from typing import Annotated, Optional, Literal
 
 
-import pandas as pd
 import numpy as np
 
-from fastapi import Depends, status
+from fastapi import Depends, Header, Query, Request, Response, status
 from fastapi.exceptions import HTTPException
 from fastapi.routing import APIRouter
 
-from sqlmodel import select, or_, func, text
+from sqlalchemy import tuple_
+from sqlmodel import select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel.sql import _expression_select_cls as sql_types
 
 from pydantic import BaseModel
 
 
-from database import User, SessionDep, Entry
+from database import engine, User, SessionDep, Entry, EntryPublic, Scenario, DailyBest, SyncWatermark, select_public_entries
 
 from auth import get_current_active_user
-from voltaic import VOLTAIC
+from benchmarks import Benchmark, find_benchmark, has_season
+from snapshots import PercentileSnapshot, EnergyDistribution, get_percentile_snapshot, get_energy_distribution
+from sketch import load_digest
+from energy import BenchmarkEnergy, get_benchmark_energy
+from conditional import entity_tag, not_modified, set_validators
+from encoding import ResponseFormat, negotiate_format, project_columns, encoded_response, ndjson_response
+from response_cache import cached_response, json_response
+from leaderboard import LEADERBOARD_MAX_LIMIT, LeaderboardPage, LeaderboardRank, get_energy_ranking, get_scenario_ranking, leaderboard_page, leaderboard_rank
+
+# ----------------------------------------- CONFIG -----------------------------------------
+
+DEFAULT_PAGE_SIZE = 1_000
+MAX_PAGE_SIZE = 10_000
+STREAM_CHUNK_SIZE = 1_000
+
+# ----------------------------------------- MODELS -----------------------------------------
 
 class BenchmarkResponse(BaseModel):
-    entries: list[Entry]
+    entries: list[EntryPublic]
     thresholds: dict[str, tuple[int, int, int, int]]
     energy_thresholds: tuple[int, int, int, int]
+    next_cursor: str | None = None
 
-# ----------------------------------------- ENDPOINTS -----------------------------------------
+class DailyBestPublic(BaseModel):
+    hash: str
+    scenario: str | None
+    day: date
+    score: float
 
-entry_router = APIRouter(prefix="/entry", tags=["Entry"])
+class DailyBestResponse(BaseModel):
+    days: list[DailyBestPublic]
+    thresholds: dict[str, tuple[int, int, int, int]]
+    energy_thresholds: tuple[int, int, int, int]
 
-@entry_router.get("/me/vt-s{season}-{difficulty}/{date_query}")
-async def read_own_entries(
-        season: int,
-        difficulty: Literal["novice", "intermediate", "advanced"],
-        current_user: Annotated[User, Depends(get_current_active_user)],
-        session: SessionDep,
-        date_query: Optional[str],
-    ) -> BenchmarkResponse:
+class PercentileRank(BaseModel):
+    hash: str
+    score: float
+    percentile: float | None
+    users: int
+    updated_at: datetime | None
+
+class EnergyPosition(BaseModel):
+    distribution: EnergyDistribution
+    energy: float | None
+    rank: int | None
+    percentile: float | None
 
-    s = VOLTAIC.get(season)
-    if s is None:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, detail=f"Season {season} not found.")
-    
-    thresholds = s.get(difficulty)
-    if thresholds is None:
+class BestPercentiles(BaseModel):
+    percentiles: dict[str, list[dict[str, float]]]
+    users: dict[str, int]
+
+# ----------------------------------------- HELPER FUNCTIONS -----------------------------------------
+
+def get_benchmark(season: int, difficulty: str) -> Benchmark:
+    benchmark = find_benchmark("vt", season, difficulty)
+    if benchmark is None:
+        if not has_season("vt", season):
+            raise HTTPException(status.HTTP_404_NOT_FOUND, detail=f"Season {season} not found.")
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail=f"Difficulty {difficulty} not found.")
+    return benchmark
 
-    base_query = select(Entry).where(Entry.user_id == current_user.id).where(or_(Entry.hash == hash for hash in thresholds.keys()))
-    query = parse_date_query(date_query, base_query)
-    entries = session.exec(query).all()
-    if difficulty == "novice":
-        energy_thresholds = 100, 200, 300, 400
-    elif difficulty == "intermediate":
-        energy_thresholds = 500, 600, 700, 800
-    elif difficulty == "advanced":
-        energy_thresholds = 900, 1000, 1100, 1200
-    return BenchmarkResponse(entries=entries, thresholds=thresholds, energy_thresholds=energy_thresholds)
+async def get_scenario_id(session: SessionDep, hash_: str) -> int:
+    scenario_id = (await session.exec(select(Scenario.id).where(Scenario.hash == hash_))).first()
+    if scenario_id is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail=f"Scenario {hash_} not found.")
+    return scenario_id
 
-def parse_date_query(date_query: Optional[str], base_query: sql_types.SelectOfScalar) -> sql_types.SelectOfScalar:
+def parse_date_range(date_query: Optional[str]) -> tuple[datetime, datetime] | None:
     if date_query is None or date_query == "all":
-        return base_query
+        return None
     dates = date_query.split("..")
     n_dates = len(dates)
     if n_dates > 2:
@@ -70,55 +101,281 @@ def parse_date_query(date_query: Optional[str], base_query: sql_types.SelectOfSc
         dates_.append(datetime.strptime(dates[0], "%d-%m-%Y"))
         dates_.append(datetime.strptime(dates[0], "%d-%m-%Y") + timedelta(days=1))
     else:
-        for date in dates:
-            if date == "" and len(dates_) == 0:
+        for date_ in dates:
+            if date_ == "" and len(dates_) == 0:
                 dates_.append(datetime(year=2005, month=1, day=1))
                 continue
-            if date == "" and len(dates_) == 1:
+            if date_ == "" and len(dates_) == 1:
                 dates_.append(datetime.now() + timedelta(days=1))
                 continue
-            dates_.append(datetime.strptime(date, "%d-%m-%Y"))
+            dates_.append(datetime.strptime(date_, "%d-%m-%Y"))
+    return dates_[0], dates_[1]
 
-    dates = [str(int(date.timestamp())*1_000_000_000) for date in dates_]
+def parse_date_query(date_query: Optional[str], base_query: sql_types.SelectOfScalar) -> sql_types.SelectOfScalar:
+    date_range = parse_date_range(date_query)
+    if date_range is None:
+        return base_query
+    dates = [int(date_.timestamp())*1_000_000_000 for date_ in date_range]
     return base_query.where(Entry.ctime >= dates[0]).where(Entry.ctime <= dates[1])
 
+async def user_validators(session: SessionDep, user_id: int, request: Request, benchmark: Benchmark) -> tuple[str, datetime | None]:
+    """ETag and Last-Modified of a read of the user's runs: they move with every insert of theirs."""
+    watermark = await session.get(SyncWatermark, user_id)
+    revision, updated_at = (watermark.revision, watermark.updated_at) if watermark is not None else (0, None)
+    etag = entity_tag(user_id, revision, benchmark.version, request.url.path, request.url.query, request.headers.get("accept"))
+    return etag, updated_at
+
+def encode_cursor(ctime: int, id_: int) -> str:
+    return base64.urlsafe_b64encode(f"{ctime}:{id_}".encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple[int, int]:
+    try:
+        ctime, id_ = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        return int(ctime), int(id_)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+
+def keyset(query: sql_types.SelectOfScalar, cursor: Optional[str]) -> sql_types.SelectOfScalar:
+    # Walks entries in (ctime, id) order, resuming strictly after the cursor's entry.
+    query = query.order_by(Entry.ctime, Entry.id)
+    if cursor is not None:
+        query = query.where(tuple_(Entry.ctime, Entry.id) > decode_cursor(cursor))
+    return query
+
+async def stream_partitions(query: sql_types.SelectOfScalar):
+    # Owns its session: the response body is produced after the endpoint has returned.
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        result = await session.stream(query.execution_options(yield_per=STREAM_CHUNK_SIZE))
+        async for rows in result.partitions():
+            yield rows
+
+async def build_daily_best(session: SessionDep, user_id: int, benchmark: Benchmark, date_query: Optional[str]) -> Response:
+    query = (
+        select(Scenario.hash, Scenario.name.label("scenario"), DailyBest.day, DailyBest.score)
+        .join(Scenario, DailyBest.scenario_id == Scenario.id)
+        .where(DailyBest.user_id == user_id)
+        .where(Scenario.hash.in_(benchmark.hashes))
+        .order_by(DailyBest.day)
+    )
+    date_range = parse_date_range(date_query)
+    if date_range is not None:
+        query = query.where(DailyBest.day >= date_range[0].date()).where(DailyBest.day < date_range[1].date())
+    days = [DailyBestPublic(**row._mapping) for row in await session.exec(query)]
+    return json_response(DailyBestResponse(days=days, thresholds=benchmark.thresholds, energy_thresholds=benchmark.energy_thresholds))
+
+# ----------------------------------------- ENDPOINTS -----------------------------------------
+
+entry_router = APIRouter(prefix="/entry", tags=["Entry"])
+
+@entry_router.get("/me/vt-s{season}-{difficulty}/{date_query}")
+async def read_own_entries(
+        season: int,
+        difficulty: Literal["novice", "intermediate", "advanced"],
+        current_user: Annotated[User, Depends(get_current_active_user)],
+        session: SessionDep,
+        date_query: Optional[str],
+        request: Request,
+        fields: Optional[str] = None,
+        format: Optional[ResponseFormat] = None,
+        accept: Annotated[Optional[str], Header()] = None,
+        cursor: Optional[str] = None,
+        limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None,
+    ) -> BenchmarkResponse:
+    # `fields` projects the entries, `format` (or the Accept header) picks rows, columns, Arrow or NDJSON.
+    # `cursor`/`limit` page through the history in (ctime, id) order; pages carry the next cursor.
+    benchmark = get_benchmark(season, difficulty)
+    etag, last_modified = await user_validators(session, current_user.id, request, benchmark)
+    if (response := not_modified(request, etag, last_modified)) is not None:
+        return response
+
+    base_query = select_public_entries().where(Entry.user_id == current_user.id).where(Scenario.hash.in_(benchmark.hashes))
+    query = project_columns(parse_date_query(date_query, base_query), fields)
+    names = [column.key for column in query.selected_columns]
+    format = negotiate_format(format, accept)
+    meta = {"thresholds" : benchmark.thresholds, "energy_thresholds" : benchmark.energy_thresholds}
+
+    if format == "ndjson":
+        query = keyset(query, cursor)
+        if limit is not None:
+            query = query.limit(limit)
+        response = ndjson_response(names, stream_partitions(query), meta)
+        set_validators(response, etag, last_modified)
+        return response
+
+    async def build() -> Response:
+        if cursor is None and limit is None:
+            return encoded_response(format, names, (await session.execute(query)).all(), meta)
+        page_size = limit or DEFAULT_PAGE_SIZE
+        page_query = keyset(query, cursor).add_columns(Entry.ctime.label("cursor_ctime"), Entry.id.label("cursor_id")).limit(page_size + 1)
+        rows = (await session.execute(page_query)).all()
+        meta["next_cursor"] = encode_cursor(*rows[page_size - 1][-2:]) if len(rows) > page_size else None
+        return encoded_response(format, names, [row[:-2] for row in rows[:page_size]], meta)
+
+    # The ETag moves with the user's sync revision, so their inserts retire the cached body.
+    response = await cached_response(f"entries:{etag}", build)
+    set_validators(response, etag, last_modified)
+    return response
+
+@entry_router.get("/me/daily/vt-s{season}-{difficulty}/{date_query}")
+async def read_own_daily_best(
+        season: int,
+        difficulty: Literal["novice", "intermediate", "advanced"],
+        current_user: Annotated[User, Depends(get_current_active_user)],
+        session: SessionDep,
+        date_query: Optional[str],
+        request: Request,
+    ) -> DailyBestResponse:
+
+    benchmark = get_benchmark(season, difficulty)
+    etag, last_modified = await user_validators(session, current_user.id, request, benchmark)
+    if (cached := not_modified(request, etag, last_modified)) is not None:
+        return cached
+    response = await cached_response(f"daily:{etag}", lambda: build_daily_best(session, current_user.id, benchmark, date_query))
+    set_validators(response, etag, last_modified)
+    return response
+
+@entry_router.get("/me/energy/vt-s{season}-{difficulty}")
+async def read_own_energy(
+        season: int,
+        difficulty: Literal["novice", "intermediate", "advanced"],
+        current_user: Annotated[User, Depends(get_current_active_user)],
+        session: SessionDep,
+        request: Request,
+        response: Response,
+    ) -> BenchmarkEnergy:
+
+    benchmark = get_benchmark(season, difficulty)
+    etag, last_modified = await user_validators(session, current_user.id, request, benchmark)
+    if (cached := not_modified(request, etag, last_modified)) is not None:
+        return cached
+    set_validators(response, etag, last_modified)
+    return await get_benchmark_energy(session, current_user.id, benchmark)
 
 @entry_router.get("/percentiles/vt-s{season}-{difficulty}")
 async def get_percentiles(
+        season: int,
+        difficulty: Literal["novice", "intermediate", "advanced"],
+        request: Request,
+    ) -> PercentileSnapshot:
+
+    benchmark = get_benchmark(season, difficulty)
+    snapshot = await get_percentile_snapshot(benchmark)
+    etag = entity_tag(snapshot.version, benchmark.version)
+    if (cached := not_modified(request, etag, snapshot.computed_at, private=False)) is not None:
+        return cached
+    async def build() -> Response:
+        return json_response(snapshot)
+    response = await cached_response(f"percentiles:{etag}", build)
+    set_validators(response, etag, snapshot.computed_at, private=False)
+    return response
+
+@entry_router.get("/energy-distribution/vt-s{season}-{difficulty}")
+async def get_population_energy(
         season: int,
         difficulty: Literal["novice", "intermediate", "advanced"],
         session: SessionDep,
-    ):
-
-    s = VOLTAIC.get(season)
-    if s is None:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, detail=f"Season {season} not found.")
-    
-    thresholds = s.get(difficulty)
-    if thresholds is None:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, detail=f"Difficulty {difficulty} not found.")
+        request: Request,
+        response: Response,
+    ) -> EnergyDistribution:
+    # Overall energies of the players with every category played, at most `max_age` seconds old.
+    benchmark = get_benchmark(season, difficulty)
+    distribution = await get_energy_distribution(session, benchmark)
+    etag = entity_tag(distribution.version, benchmark.version)
+    if (cached := not_modified(request, etag, distribution.computed_at, private=False)) is not None:
+        return cached
+    set_validators(response, etag, distribution.computed_at, private=False)
+    return distribution
+
+@entry_router.get("/me/energy-distribution/vt-s{season}-{difficulty}")
+async def read_own_energy_position(
+        season: int,
+        difficulty: Literal["novice", "intermediate", "advanced"],
+        current_user: Annotated[User, Depends(get_current_active_user)],
+        session: SessionDep,
+    ) -> EnergyPosition:
 
-    query = f"""WITH percentiles AS (
-                SELECT generate_series(1, 100) AS percentile
-                )
+    benchmark = get_benchmark(season, difficulty)
+    distribution = await get_energy_distribution(session, benchmark)
+    energy = (await get_benchmark_energy(session, current_user.id, benchmark)).energy
+    if energy is None:
+        return EnergyPosition(distribution=distribution, energy=None, rank=None, percentile=None)
+    ranking = await get_energy_ranking(session, benchmark)
+    percentile = 100 * ranking.below(energy) / len(ranking) if len(ranking) else None
+    return EnergyPosition(distribution=distribution, energy=energy, rank=ranking.rank_of(energy), percentile=percentile)
 
-                SELECT
-                p.percentile,
-                percentile_cont(p.percentile / 100.0) WITHIN GROUP (ORDER BY e.score) AS score_percentile,
-                MAX(e.hash) as hash
+@entry_router.get("/best-percentiles/vt-s{season}-{difficulty}")
+async def get_best_percentiles(
+        season: int,
+        difficulty: Literal["novice", "intermediate", "advanced"],
+        session: SessionDep,
+    ) -> BestPercentiles:
+    # Percentiles of the players' personal bests, read from the scenario sketches.
+    benchmark = get_benchmark(season, difficulty)
+    scenarios = (await session.exec(select(Scenario.hash, Scenario.id).where(Scenario.hash.in_(benchmark.hashes)))).all()
+
+    percentiles, users = {}, {}
+    levels = np.arange(1, 101)
+    for hash_, scenario_id in scenarios:
+        loaded = await load_digest(session, scenario_id)
+        if loaded is None:
+            continue
+        digest, row = loaded
+        scores = digest.quantile(levels / 100)
+        percentiles[hash_] = [{"percentile" : int(p), "score" : float(score)} for p, score in zip(levels, scores)]
+        users[hash_] = row.users
+    return BestPercentiles(percentiles=percentiles, users=users)
 
-                FROM
-                percentiles p
-                JOIN
-                entry e ON e.hash IN ({", ".join([f"'{hash_}'" for hash_ in thresholds.keys()])})
+@entry_router.get("/percentile-rank/{hash_}")
+async def get_percentile_rank(hash_: str, score: float, session: SessionDep) -> PercentileRank:
+    # Share of players whose personal best on the scenario is below `score`.
+    scenario_id = await get_scenario_id(session, hash_)
+    loaded = await load_digest(session, scenario_id)
+    if loaded is None:
+        return PercentileRank(hash=hash_, score=score, percentile=None, users=0, updated_at=None)
+    digest, row = loaded
+    return PercentileRank(hash=hash_, score=score, percentile=float(digest.cdf(score)) * 100, users=row.users, updated_at=row.updated_at)
 
-                GROUP BY
-                p.percentile, e.hash
-                
-                ORDER BY
-                p.percentile;"""
+@entry_router.get("/leaderboard/vt-s{season}-{difficulty}")
+async def get_energy_leaderboard(
+        season: int,
+        difficulty: Literal["novice", "intermediate", "advanced"],
+        session: SessionDep,
+        limit: Annotated[int, Query(ge=1, le=LEADERBOARD_MAX_LIMIT)] = 10,
+        offset: Annotated[int, Query(ge=0)] = 0,
+    ) -> LeaderboardPage:
+    # Players with every category played, by overall energy.
+    benchmark = get_benchmark(season, difficulty)
+    ranking = await get_energy_ranking(session, benchmark)
+    return await leaderboard_page(session, ranking, limit, offset)
 
-    result = session.exec(text(query)).all()
-    result_df = pd.DataFrame(result, columns=["percentile", "score", "hash"])
+@entry_router.get("/leaderboard/scenario/{hash_}")
+async def get_scenario_leaderboard(
+        hash_: str,
+        session: SessionDep,
+        limit: Annotated[int, Query(ge=1, le=LEADERBOARD_MAX_LIMIT)] = 10,
+        offset: Annotated[int, Query(ge=0)] = 0,
+    ) -> LeaderboardPage:
+    # Players by personal best on the scenario.
+    ranking = await get_scenario_ranking(session, await get_scenario_id(session, hash_))
+    return await leaderboard_page(session, ranking, limit, offset)
+
+@entry_router.get("/me/leaderboard-rank/vt-s{season}-{difficulty}")
+async def read_own_energy_rank(
+        season: int,
+        difficulty: Literal["novice", "intermediate", "advanced"],
+        current_user: Annotated[User, Depends(get_current_active_user)],
+        session: SessionDep,
+    ) -> LeaderboardRank:
+
+    benchmark = get_benchmark(season, difficulty)
+    return leaderboard_rank(await get_energy_ranking(session, benchmark), current_user.id)
+
+@entry_router.get("/me/leaderboard-rank/scenario/{hash_}")
+async def read_own_scenario_rank(
+        hash_: str,
+        current_user: Annotated[User, Depends(get_current_active_user)],
+        session: SessionDep,
+    ) -> LeaderboardRank:
 
-    return {hash_ : list(result_df[result_df["hash"] == hash_].drop("hash", axis=1).reset_index(drop=True).T.to_dict().values()) for hash_ in result_df["hash"].unique()}
\ No newline at end of file
+    ranking = await get_scenario_ranking(session, await get_scenario_id(session, hash_))
+    return leaderboard_rank(ranking, current_user.id)
@@ -0,0 +1,196 @@
+import datetime
+
+from sqlalchemy import and_, or_, insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import sketch
+import leaderboard
+import snapshots
+from database import engine, on_commit, dialect_insert, greatest, Entry, EntryBase, Scenario, SettingsProfile, DailyBest, ScenarioBest, SyncWatermark, ScenarioWatermark
+
+# ----------------------------------------- CONFIG -----------------------------------------
+
+INSERT_CHUNK_SIZE = 5_000
+
+SETTINGS_COLUMNS = ("sens_scale", "sens_increment", "dpi", "fov_scale", "fov")
+
+# Interned ids never change, so every lookup is remembered for the lifetime of the process.
+scenario_ids: dict[str, int] = {}
+settings_ids: dict[tuple, int] = {}
+# Scenarios interned from runs without a name: the first run that has one fills it in.
+unnamed_scenarios: set[str] = set()
+
+# ----------------------------------------- HELPER FUNCTIONS -----------------------------------------
+
+def settings_key(entry: EntryBase) -> tuple:
+    return tuple(getattr(entry, column) for column in SETTINGS_COLUMNS)
+
+async def intern_scenarios(entries: list[EntryBase]) -> dict[str, int]:
+    missing = {}
+    for entry in entries:
+        if entry.hash not in scenario_ids or (entry.hash in unnamed_scenarios and entry.scenario is not None):
+            # A run without a name never overrides one that has it.
+            if missing.get(entry.hash) is None:
+                missing[entry.hash] = entry.scenario
+    if missing:
+        # Interned rows are committed on their own connection: they stay valid even if the
+        # transaction storing the entries is rolled back, so caching their ids is always safe.
+        async with engine.begin() as conn:
+            statement = dialect_insert(Scenario).values([{"hash" : hash_, "name" : name} for hash_, name in missing.items()])
+            await conn.execute(statement.on_conflict_do_update(
+                index_elements=["hash"],
+                set_={"name" : statement.excluded.name},
+                where=Scenario.name.is_(None),
+            ))
+            rows = await conn.execute(select(Scenario.hash, Scenario.id, Scenario.name).where(Scenario.hash.in_(missing)))
+            for hash_, id_, name in rows:
+                scenario_ids[hash_] = id_
+                if name is None:
+                    unnamed_scenarios.add(hash_)
+                else:
+                    unnamed_scenarios.discard(hash_)
+    return scenario_ids
+
+def match_settings(keys):
+    columns = [getattr(SettingsProfile, column) for column in SETTINGS_COLUMNS]
+    return or_(*(and_(*(column.is_not_distinct_from(value) for column, value in zip(columns, key))) for key in keys))
+
+async def intern_settings(entries: list[EntryBase]) -> dict[tuple, int]:
+    missing = {settings_key(entry) for entry in entries} - settings_ids.keys()
+    if missing:
+        async with engine.begin() as conn:
+            query = select(SettingsProfile.id, *(getattr(SettingsProfile, column) for column in SETTINGS_COLUMNS)).order_by(SettingsProfile.id.desc())
+            # NULL settings never trip the unique constraint, so look before inserting.
+            for id_, *key in await conn.execute(query.where(match_settings(missing))):
+                settings_ids[tuple(key)] = id_
+            missing -= settings_ids.keys()
+            if missing:
+                await conn.execute(
+                    dialect_insert(SettingsProfile)
+                    .values([dict(zip(SETTINGS_COLUMNS, key)) for key in missing])
+                    .on_conflict_do_nothing()
+                )
+                for id_, *key in await conn.execute(query.where(match_settings(missing))):
+                    settings_ids[tuple(key)] = id_
+    return settings_ids
+
+async def entry_rows(user_id: int, entries: list[EntryBase]) -> list[dict]:
+    scenarios = await intern_scenarios(entries)
+    settings = await intern_settings(entries)
+    return [
+        {
+            "user_id" : user_id,
+            "scenario_id" : scenarios[entry.hash],
+            "settings_id" : settings[settings_key(entry)],
+            "score" : entry.score,
+            "ctime" : entry.ctime,
+        }
+        for entry in entries
+    ]
+
+def ctime_day(ctime: int) -> datetime.date:
+    return datetime.datetime.fromtimestamp(ctime // 1_000_000_000, datetime.UTC).date()
+
+async def update_daily_best(session: AsyncSession, rows: list[dict]) -> None:
+    best: dict[tuple, float] = {}
+    for row in rows:
+        key = row["user_id"], row["scenario_id"], ctime_day(row["ctime"])
+        if key not in best or row["score"] > best[key]:
+            best[key] = row["score"]
+    # Sorted so concurrent uploads lock rollup rows in the same order.
+    values = [{"user_id" : u, "scenario_id" : s, "day" : d, "score" : score} for (u, s, d), score in sorted(best.items())]
+    for start in range(0, len(values), INSERT_CHUNK_SIZE):
+        stmt = dialect_insert(DailyBest).values(values[start:start + INSERT_CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "scenario_id", "day"],
+            set_={"score" : greatest(DailyBest.score, stmt.excluded.score)},
+        )
+        await session.execute(stmt)
+
+async def update_scenario_best(session: AsyncSession, rows: list[dict]) -> list[tuple[int, float | None, float]]:
+    """Raises the stored personal bests and returns the improvements as (scenario_id, previous, new)."""
+    best: dict[int, dict] = {}
+    for row in rows:
+        current = best.get(row["scenario_id"])
+        if current is None or row["score"] > current["score"]:
+            best[row["scenario_id"]] = row
+    if not best:
+        return []
+
+    user_id = rows[0]["user_id"]
+    existing_query = (
+        select(ScenarioBest.scenario_id, ScenarioBest.score)
+        .where(ScenarioBest.user_id == user_id)
+        .where(ScenarioBest.scenario_id.in_(best))
+        .with_for_update()
+    )
+    existing = dict((await session.execute(existing_query)).all())
+    improved = [
+        (scenario_id, existing.get(scenario_id), row["score"])
+        for scenario_id, row in sorted(best.items())
+        if scenario_id not in existing or row["score"] > existing[scenario_id]
+    ]
+    if improved:
+        stmt = dialect_insert(ScenarioBest).values([
+            {"user_id" : user_id, "scenario_id" : scenario_id, "score" : score, "ctime" : best[scenario_id]["ctime"]}
+            for scenario_id, _, score in improved
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "scenario_id"],
+            set_={"score" : stmt.excluded.score, "ctime" : stmt.excluded.ctime},
+            where=ScenarioBest.score < stmt.excluded.score,
+        )
+        await session.execute(stmt)
+    return improved
+
+async def update_watermarks(session: AsyncSession, rows: list[dict]) -> None:
+    latest: dict[int, int] = {}
+    for row in rows:
+        if row["ctime"] > latest.get(row["scenario_id"], -1):
+            latest[row["scenario_id"]] = row["ctime"]
+    if not latest:
+        return
+
+    user_id = rows[0]["user_id"]
+    stmt = dialect_insert(ScenarioWatermark).values([
+        {"user_id" : user_id, "scenario_id" : scenario_id, "ctime" : ctime} for scenario_id, ctime in sorted(latest.items())
+    ])
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id", "scenario_id"],
+        set_={"ctime" : greatest(ScenarioWatermark.ctime, stmt.excluded.ctime)},
+    ))
+    now = datetime.datetime.now(datetime.UTC)
+    stmt = dialect_insert(SyncWatermark).values(user_id=user_id, ctime=max(latest.values()), revision=1, updated_at=now)
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            "ctime" : greatest(SyncWatermark.ctime, stmt.excluded.ctime),
+            "revision" : SyncWatermark.revision + 1,
+            "updated_at" : stmt.excluded.updated_at,
+        },
+    ))
+
+async def insert_entries(session: AsyncSession, user_id: int, entries: list[EntryBase]) -> list[int]:
+    """Stores the runs of one user in the session's transaction and returns their ids, in order.
+
+    The caller commits.
+    """
+    rows = await entry_rows(user_id, entries)
+    ids = []
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        result = await session.execute(
+            insert(Entry).returning(Entry.id, sort_by_parameter_order=True),
+            rows[start:start + INSERT_CHUNK_SIZE],
+        )
+        ids.extend(result.scalars())
+    await update_daily_best(session, rows)
+    await update_watermarks(session, rows)
+    improved = await update_scenario_best(session, rows)
+    if improved:
+        hashes = {scenario_ids[entry.hash] : entry.hash for entry in entries}
+        on_commit(session, lambda: sketch.record_bests(improved))
+        on_commit(session, lambda: leaderboard.record_bests(user_id, improved, hashes))
+    if ids:
+        on_commit(session, lambda: snapshots.record_inserts(len(ids)))
+    return ids
@@ -0,0 +1,188 @@
+import os
+import time
+import asyncio
+
+import numpy as np
+from pydantic import BaseModel
+from sortedcontainers import SortedList
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import User, Scenario, ScenarioBest
+from benchmarks import Benchmark
+
+# ----------------------------------------- CONFIG -----------------------------------------
+
+# Rankings are kept up to date by this process' inserts; rebuilding them bounds how long
+# inserts served by other workers take to show up.
+LEADERBOARD_REBUILD_SECONDS = float(os.environ.get("LEADERBOARD_REBUILD_SECONDS", 900))
+LEADERBOARD_MAX_LIMIT = 100
+
+# ----------------------------------------- MODELS -----------------------------------------
+
+class LeaderboardRow(BaseModel):
+    rank: int
+    username: str
+    value: float
+
+class LeaderboardPage(BaseModel):
+    players: int
+    rows: list[LeaderboardRow]
+
+class LeaderboardRank(BaseModel):
+    players: int
+    rank: int | None
+    value: float | None
+
+# ----------------------------------------- RANKINGS -----------------------------------------
+
+class Ranking:
+    """Players ordered by a value, highest first; rank lookups and updates are O(log n).
+
+    Tied players share the best rank of the tie.
+    """
+
+    def __init__(self):
+        self.values: dict[int, float] = {}
+        self.order = SortedList()
+        self.built_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def expired(self) -> bool:
+        return time.monotonic() - self.built_at > LEADERBOARD_REBUILD_SECONDS
+
+    def set(self, user_id: int, value: float) -> None:
+        previous = self.values.get(user_id)
+        if previous is not None:
+            self.order.remove((-previous, user_id))
+        self.values[user_id] = value
+        self.order.add((-value, user_id))
+
+    def discard(self, user_id: int) -> None:
+        previous = self.values.pop(user_id, None)
+        if previous is not None:
+            self.order.remove((-previous, user_id))
+
+    def raise_to(self, user_id: int, value: float) -> None:
+        if value > self.values.get(user_id, -np.inf):
+            self.set(user_id, value)
+
+    def load(self, rows) -> None:
+        """Bulk-merges (user_id, value) rows, keeping the higher value of every player."""
+        for user_id, value in rows:
+            if value > self.values.get(user_id, -np.inf):
+                self.values[user_id] = value
+        self.order = SortedList((-value, user_id) for user_id, value in self.values.items())
+
+    def rank_of(self, value: float) -> int:
+        return self.order.bisect_left((-value,)) + 1
+
+    def below(self, value: float) -> int:
+        return len(self.order) - self.order.bisect_right((-value, np.inf))
+
+    def rank(self, user_id: int) -> int | None:
+        value = self.values.get(user_id)
+        return None if value is None else self.rank_of(value)
+
+    def top(self, limit: int, offset: int = 0) -> list[tuple[int, int, float]]:
+        return [(self.rank_of(-value), user_id, -value) for value, user_id in self.order.islice(offset, offset + limit)]
+
+# ----------------------------------------- STATE -----------------------------------------
+
+scenario_rankings: dict[int, Ranking] = {}
+# Rankings whose rows are still being read: inserts committed meanwhile are applied to them too.
+building_rankings: dict[int, Ranking] = {}
+energy_rankings: dict[tuple[str, int, str], Ranking] = {}
+energy_scenario_ids: dict[tuple[str, int, str], list[int | None]] = {}
+energy_benchmarks: dict[tuple[str, int, str], Benchmark] = {}
+build_lock = asyncio.Lock()
+
+# ----------------------------------------- HELPER FUNCTIONS -----------------------------------------
+
+def player_energy(key: tuple[str, int, str], user_id: int) -> float:
+    scores = np.array([
+        scenario_rankings[scenario_id].values.get(user_id, np.nan) if scenario_id in scenario_rankings else np.nan
+        for scenario_id in energy_scenario_ids[key]
+    ])
+    return float(energy_benchmarks[key].overall_energies(scores))
+
+def record_bests(user_id: int, improved: list[tuple[int, float | None, float]], hashes: dict[int, str]) -> None:
+    """Applies the committed personal-best improvements of one player to the built rankings."""
+    for scenario_id, _, score in improved:
+        for rankings in (scenario_rankings, building_rankings):
+            if scenario_id in rankings:
+                rankings[scenario_id].raise_to(user_id, score)
+
+    for key, ranking in list(energy_rankings.items()):
+        benchmark, ids = energy_benchmarks[key], energy_scenario_ids[key]
+        positions = [benchmark.index[hashes[scenario_id]] for scenario_id, _, _ in improved if hashes.get(scenario_id) in benchmark.index]
+        if not positions:
+            continue
+        if any(ids[i] is None for i in positions):
+            # Nobody had played this scenario when the ranking was built: read everything again.
+            del energy_rankings[key]
+            continue
+        energy = player_energy(key, user_id)
+        if np.isnan(energy):
+            ranking.discard(user_id)
+        else:
+            ranking.set(user_id, energy)
+
+async def build_scenario_ranking(session: AsyncSession, scenario_id: int) -> Ranking:
+    ranking = building_rankings[scenario_id] = Ranking()
+    try:
+        query = select(ScenarioBest.user_id, ScenarioBest.score).where(ScenarioBest.scenario_id == scenario_id)
+        ranking.load((await session.exec(query)).all())
+    finally:
+        del building_rankings[scenario_id]
+    scenario_rankings[scenario_id] = ranking
+    return ranking
+
+async def get_scenario_ranking(session: AsyncSession, scenario_id: int) -> Ranking:
+    ranking = scenario_rankings.get(scenario_id)
+    if ranking is None or ranking.expired():
+        async with build_lock:
+            ranking = scenario_rankings.get(scenario_id)
+            if ranking is None or ranking.expired():
+                ranking = await build_scenario_ranking(session, scenario_id)
+    return ranking
+
+async def get_energy_ranking(session: AsyncSession, benchmark: Benchmark) -> Ranking:
+    ranking = energy_rankings.get(benchmark.key)
+    if ranking is not None and not ranking.expired():
+        return ranking
+
+    scenario_ids = dict((await session.exec(select(Scenario.hash, Scenario.id).where(Scenario.hash.in_(benchmark.hashes)))).all())
+    ids = [scenario_ids.get(hash_) for hash_ in benchmark.hashes]
+    for scenario_id in ids:
+        if scenario_id is not None:
+            await get_scenario_ranking(session, scenario_id)
+
+    # No awaits from here on: the matrix reflects every insert committed so far.
+    rankings = [scenario_rankings[scenario_id] if scenario_id is not None else Ranking() for scenario_id in ids]
+    users = np.array(sorted(set().union(*(ranking.values for ranking in rankings))), dtype=np.int64)
+    position = {user_id : i for i, user_id in enumerate(users.tolist())}
+    scores = np.full((len(users), len(ids)), np.nan)
+    for column, scenario_ranking in enumerate(rankings):
+        rows = [position[user_id] for user_id in scenario_ranking.values]
+        scores[rows, column] = list(scenario_ranking.values.values())
+    energies = benchmark.overall_energies(scores)
+    ranked = ~np.isnan(energies)
+
+    ranking = Ranking()
+    ranking.load(zip(users[ranked].tolist(), energies[ranked].tolist()))
+    energy_scenario_ids[benchmark.key] = ids
+    energy_benchmarks[benchmark.key] = benchmark
+    energy_rankings[benchmark.key] = ranking
+    return ranking
+
+async def leaderboard_page(session: AsyncSession, ranking: Ranking, limit: int, offset: int) -> LeaderboardPage:
+    top = ranking.top(limit, offset)
+    usernames = dict((await session.exec(select(User.id, User.username).where(User.id.in_([user_id for _, user_id, _ in top])))).all())
+    rows = [LeaderboardRow(rank=rank, username=usernames[user_id], value=value) for rank, user_id, value in top if user_id in usernames]
+    return LeaderboardPage(players=len(ranking), rows=rows)
+
+def leaderboard_rank(ranking: Ranking, user_id: int) -> LeaderboardRank:
+    return LeaderboardRank(players=len(ranking), rank=ranking.rank(user_id), value=ranking.values.get(user_id))
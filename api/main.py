@@ -1,14 +1,24 @@
 import os
+import asyncio
 
 from contextlib import asynccontextmanager
 
 
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES
 
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
 
-from database import create_db_and_tables
 
-from auth import auth_router
+from database import create_db_and_tables, engine
+from snapshots import refresh_snapshots_forever
+
+from response_cache import response_cache
+from auth import auth_router, passwd_executor
 from entry import entry_router
 from user import user_router
 from me import me_router
@@ -18,17 +28,33 @@ from download import download_router
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_db_and_tables()
+    await create_db_and_tables()
+    refresher = asyncio.create_task(refresh_snapshots_forever())
     yield
+    refresher.cancel()
+    passwd_executor.shutdown(wait=False, cancel_futures=True)
+    await engine.dispose()
 
 app = FastAPI(lifespan=lifespan)
 
+# Brotli when available (it falls back to gzip for clients without it), gzip otherwise.
+# Binary downloads are sent as they are: they keep their Content-Length and byte ranges.
+COMPRESSION_MINIMUM_SIZE = int(os.environ.get("COMPRESSION_MINIMUM_SIZE", 1_000))
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSION_MINIMUM_SIZE, excluded_handlers=[r"^/download/.+\.exe$"])
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MINIMUM_SIZE, exclude_content_types=(*DEFAULT_EXCLUDED_CONTENT_TYPES, "application/octet-stream"))
+
 app.include_router(auth_router)
 app.include_router(entry_router)
 app.include_router(user_router)
 app.include_router(me_router)
 app.include_router(download_router)
 
+@app.get("/cache-stats")
+async def read_response_cache_stats() -> dict[str, int | float | str]:
+    return response_cache.stats()
+
 @app.get("/")
 async def where():
     return os.getcwd()
\ No newline at end of file
@@ -1,18 +1,50 @@
-from typing import Annotated
+from typing import Annotated, Any, Literal
 
 
-from fastapi import Depends
+from fastapi import Body, Depends, status
+from fastapi.exceptions import HTTPException
 from fastapi.routing import APIRouter
 
+from pydantic import BaseModel, ValidationError
 from sqlmodel import select
 
 
 
-from database import SessionDep, Entry, User
+from database import SessionDep, Entry, EntryBase, EntryPublic, User, Scenario, SyncWatermark, ScenarioWatermark
 
 from auth import get_current_active_user
+import ingest
 
+# ----------------------------------------- CONFIG -----------------------------------------
 
+MAX_BATCH_SIZE = 50_000
+
+# ----------------------------------------- MODELS -----------------------------------------
+
+class InsertResult(BaseModel):
+    index: int
+    id: int | None = None
+    status: Literal["inserted", "duplicate", "invalid"]
+    detail: str | None = None
+
+class BatchInsertResponse(BaseModel):
+    inserted: int
+    duplicates: int
+    invalid: int
+    results: list[InsertResult]
+
+# ----------------------------------------- HELPER FUNCTIONS -----------------------------------------
+
+def validate_entry(item: Any) -> tuple[EntryBase | None, str | None]:
+    if not isinstance(item, dict):
+        return None, "Must be a JSON object"
+    try:
+        entry = EntryBase.model_validate(item)
+    except ValidationError as e:
+        return None, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+    return entry, None
+
+# ----------------------------------------- ENDPOINTS -----------------------------------------
 
 me_router = APIRouter(prefix="/me", tags=["User"])
 
@@ -21,18 +53,90 @@ async def read_users_me(current_user: Annotated[User, Depends(get_current_active
     return current_user
 
 @me_router.post("/insert-entry")
-async def insert_entry(entry: Entry, session: SessionDep, current_user: Annotated[User, Depends(get_current_active_user)]) -> Entry:
-    entry.user_id = current_user.id
-    session.add(entry)
-    session.commit()
-    session.refresh(entry)
-    return entry
+async def insert_entry(entry: EntryBase, session: SessionDep, current_user: Annotated[User, Depends(get_current_active_user)]) -> EntryPublic:
+    [entry_id] = await ingest.insert_entries(session, current_user.id, [entry])
+    await session.commit()
+    return EntryPublic(**entry.model_dump(), id=entry_id, user_id=current_user.id)
+
+@me_router.post("/insert-entries")
+async def insert_entries(
+        items: Annotated[list[Any], Body()],
+        session: SessionDep,
+        current_user: Annotated[User, Depends(get_current_active_user)],
+    ) -> BatchInsertResponse:
+
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"A batch can hold at most {MAX_BATCH_SIZE} entries.")
+
+    results: list[InsertResult | None] = [None] * len(items)
+    pending: dict[tuple[str, int], tuple[int, EntryBase]] = {}
+    for idx, item in enumerate(items):
+        entry, problem = validate_entry(item)
+        if problem is not None:
+            results[idx] = InsertResult(index=idx, status="invalid", detail=problem)
+            continue
+        key = (entry.hash, entry.ctime)
+        if key in pending:
+            results[idx] = InsertResult(index=idx, status="duplicate", detail=f"Same run as entry {pending[key][0]}.")
+            continue
+        pending[key] = idx, entry
+
+    # Runs already stored for this user (e.g. a tracker re-uploading after a reinstall) are reported, not re-inserted.
+    if pending:
+        scenario_ids = await ingest.intern_scenarios([entry for _, entry in pending.values()])
+        hashes = {scenario_ids[hash_] : hash_ for hash_, _ in pending}
+        ctimes = [ctime for _, ctime in pending]
+        existing_query = (
+            select(Entry.scenario_id, Entry.ctime)
+            .where(Entry.user_id == current_user.id)
+            .where(Entry.ctime >= min(ctimes))
+            .where(Entry.ctime <= max(ctimes))
+        )
+        for scenario_id, ctime in await session.exec(existing_query):
+            match = pending.pop((hashes.get(scenario_id), ctime), None)
+            if match is not None:
+                results[match[0]] = InsertResult(index=match[0], status="duplicate", detail="Already stored.")
+
+    # One transaction, multi-row INSERTs in bounded chunks.
+    ids = await ingest.insert_entries(session, current_user.id, [entry for _, entry in pending.values()])
+    await session.commit()
+    for (idx, _), entry_id in zip(pending.values(), ids):
+        results[idx] = InsertResult(index=idx, id=entry_id, status="inserted")
+
+    return BatchInsertResponse(
+        inserted=len(ids),
+        duplicates=sum(1 for r in results if r.status == "duplicate"),
+        invalid=sum(1 for r in results if r.status == "invalid"),
+        results=results,
+    )
 
 @me_router.get("/latest-entry-timestamp")
 async def latest(session: SessionDep, current_user: Annotated[User, Depends(get_current_active_user)]) -> int:
-    statement = select(Entry).where(Entry.user_id == current_user.id).order_by(Entry.ctime.desc())
-    latest = session.exec(statement).first()
+    watermark = await session.get(SyncWatermark, current_user.id)
+    if watermark:
+        return watermark.ctime
+    else:
+        return 0
+
+@me_router.get("/sync-revision")
+async def sync_revision(session: SessionDep, current_user: Annotated[User, Depends(get_current_active_user)]) -> int:
+    # Bumped by every insert of the user's, whatever the runs' timestamps: clients key their caches on it.
+    watermark = await session.get(SyncWatermark, current_user.id)
+    if watermark:
+        return watermark.revision
+    else:
+        return 0
+
+@me_router.get("/latest-entry-timestamp/{hash_}")
+async def latest_for_scenario(hash_: str, session: SessionDep, current_user: Annotated[User, Depends(get_current_active_user)]) -> int:
+    statement = (
+        select(ScenarioWatermark.ctime)
+        .join(Scenario, ScenarioWatermark.scenario_id == Scenario.id)
+        .where(ScenarioWatermark.user_id == current_user.id)
+        .where(Scenario.hash == hash_)
+    )
+    latest = (await session.exec(statement)).first()
     if latest:
-        return int(latest.ctime)
+        return latest
     else:
-        return 0
\ No newline at end of file
+        return 0
@@ -0,0 +1,188 @@
+"""Schema migrations for databases created before a model change.
+
+`create_db_and_tables` only creates missing tables, so existing deployments run these by hand
+from the api directory:
+
+    python migrations.py                # every migration, in order
+    python migrations.py entry_ctime    # a single one
+
+Each migration spells out the DDL of the schema it moves from, checks whether it still applies
+and is a no-op otherwise.
+"""
+import sys
+import asyncio
+
+from sqlalchemy import inspect, text, Integer
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import engine, create_db_and_tables
+from sketch import rebuild_sketch
+
+
+async def table_columns(conn: AsyncConnection, table: str) -> dict:
+    columns = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_columns(table))
+    return {column["name"] : column["type"] for column in columns}
+
+async def execute_all(conn: AsyncConnection, statements: list[str]) -> None:
+    for statement in statements:
+        await conn.execute(text(statement))
+
+async def entry_ctime(conn: AsyncConnection) -> None:
+    """entry.ctime: VARCHAR of nanoseconds -> BIGINT, plus the (user_id, hash, ctime) and (user_id, ctime) indexes."""
+    columns = await table_columns(conn, "entry")
+    if "hash" not in columns or isinstance(columns["ctime"], Integer):
+        return
+    if conn.dialect.name == "postgresql":
+        await execute_all(conn, [
+            "DROP INDEX IF EXISTS ix_entry_ctime",
+            "ALTER TABLE entry ALTER COLUMN ctime TYPE BIGINT USING ctime::bigint",
+        ])
+    else:
+        # SQLite cannot change a column type in place, so the table is rebuilt.
+        columns = "id, user_id, scenario, hash, score, ctime, sens_scale, sens_increment, dpi, fov_scale, fov"
+        await execute_all(conn, [
+            "DROP INDEX IF EXISTS ix_entry_ctime",
+            "DROP INDEX IF EXISTS ix_entry_hash",
+            "ALTER TABLE entry RENAME TO entry_old",
+            """CREATE TABLE entry (
+                id INTEGER NOT NULL PRIMARY KEY,
+                user_id INTEGER REFERENCES user (id),
+                scenario VARCHAR, hash VARCHAR NOT NULL, score FLOAT NOT NULL, ctime BIGINT NOT NULL,
+                sens_scale VARCHAR, sens_increment FLOAT, dpi INTEGER, fov_scale VARCHAR, fov INTEGER
+            )""",
+            f"INSERT INTO entry ({columns}) SELECT {columns.replace('ctime', 'CAST(ctime AS INTEGER)')} FROM entry_old",
+            "DROP TABLE entry_old",
+            "CREATE INDEX ix_entry_hash ON entry (hash)",
+        ])
+    await execute_all(conn, [
+        "CREATE INDEX IF NOT EXISTS ix_entry_user_id_hash_ctime ON entry (user_id, hash, ctime)",
+        "CREATE INDEX IF NOT EXISTS ix_entry_user_id_ctime ON entry (user_id, ctime)",
+    ])
+
+async def normalize_entries(conn: AsyncConnection) -> None:
+    """Moves scenario names/hashes and sensitivity/FOV settings out of entry into scenario and settingsprofile."""
+    columns = await table_columns(conn, "entry")
+    if "hash" not in columns:
+        return
+    settings = ["sens_scale", "sens_increment", "dpi", "fov_scale", "fov"]
+    same_settings = " AND ".join(f"p.{column} IS NOT DISTINCT FROM o.{column}" for column in settings)
+    # "WHERE true" keeps SQLite from parsing ON CONFLICT as a join constraint.
+    await execute_all(conn, [
+        "INSERT INTO scenario (name, hash) SELECT MAX(scenario), hash FROM entry WHERE true GROUP BY hash ON CONFLICT (hash) DO NOTHING",
+        f"INSERT INTO settingsprofile ({', '.join(settings)}) SELECT DISTINCT {', '.join(settings)} FROM entry o "
+        f"WHERE NOT EXISTS (SELECT 1 FROM settingsprofile p WHERE {same_settings})",
+        "DROP INDEX IF EXISTS ix_entry_hash",
+        "DROP INDEX IF EXISTS ix_entry_user_id_hash_ctime",
+        "DROP INDEX IF EXISTS ix_entry_user_id_ctime",
+    ])
+    if conn.dialect.name == "postgresql":
+        await execute_all(conn, [
+            "ALTER TABLE entry ADD COLUMN scenario_id INTEGER REFERENCES scenario (id), ADD COLUMN settings_id INTEGER REFERENCES settingsprofile (id)",
+            f"""UPDATE entry o SET
+                scenario_id = (SELECT s.id FROM scenario s WHERE s.hash = o.hash),
+                settings_id = (SELECT MIN(p.id) FROM settingsprofile p WHERE {same_settings})""",
+            "ALTER TABLE entry ALTER COLUMN scenario_id SET NOT NULL",
+            "ALTER TABLE entry " + ", ".join(f"DROP COLUMN {column}" for column in ["scenario", "hash", *settings]),
+        ])
+    else:
+        await execute_all(conn, [
+            "ALTER TABLE entry RENAME TO entry_old",
+            """CREATE TABLE entry (
+                id INTEGER NOT NULL PRIMARY KEY,
+                user_id INTEGER REFERENCES user (id),
+                scenario_id INTEGER NOT NULL REFERENCES scenario (id),
+                settings_id INTEGER REFERENCES settingsprofile (id),
+                score FLOAT NOT NULL, ctime BIGINT NOT NULL
+            )""",
+            f"""INSERT INTO entry (id, user_id, scenario_id, settings_id, score, ctime)
+                SELECT o.id, o.user_id, s.id, (SELECT MIN(p.id) FROM settingsprofile p WHERE {same_settings}), o.score, o.ctime
+                FROM entry_old o JOIN scenario s ON s.hash = o.hash""",
+            "DROP TABLE entry_old",
+        ])
+    await execute_all(conn, [
+        "CREATE INDEX IF NOT EXISTS ix_entry_user_id_scenario_id_ctime ON entry (user_id, scenario_id, ctime)",
+        "CREATE INDEX IF NOT EXISTS ix_entry_user_id_ctime ON entry (user_id, ctime)",
+        "CREATE INDEX IF NOT EXISTS ix_entry_scenario_id ON entry (scenario_id)",
+    ])
+
+async def backfill_daily_best(conn: AsyncConnection) -> None:
+    """Fills dailybest from every stored run. Safe to re-run: existing days keep the higher score."""
+    if conn.dialect.name == "postgresql":
+        day, greatest = "(to_timestamp(ctime / 1000000000) AT TIME ZONE 'UTC')::date", "GREATEST"
+    else:
+        day, greatest = "date(ctime / 1000000000, 'unixepoch')", "MAX"
+    await conn.execute(text(f"""
+        INSERT INTO dailybest (user_id, scenario_id, day, score)
+        SELECT user_id, scenario_id, {day}, MAX(score)
+        FROM entry
+        WHERE user_id IS NOT NULL AND score IS NOT NULL AND ctime IS NOT NULL
+        GROUP BY user_id, scenario_id, {day}
+        ON CONFLICT (user_id, scenario_id, day) DO UPDATE SET score = {greatest}(dailybest.score, excluded.score)
+    """))
+
+async def backfill_scenario_best(conn: AsyncConnection) -> None:
+    """Fills scenariobest with every user's best score per scenario, then rebuilds the scenario sketches."""
+    await execute_all(conn, [
+        """INSERT INTO scenariobest (user_id, scenario_id, score)
+           SELECT user_id, scenario_id, MAX(score) FROM entry
+           WHERE user_id IS NOT NULL AND score IS NOT NULL
+           GROUP BY user_id, scenario_id
+           ON CONFLICT (user_id, scenario_id) DO UPDATE SET score = excluded.score""",
+        """UPDATE scenariobest SET ctime = (
+               SELECT MIN(e.ctime) FROM entry e
+               WHERE e.user_id = scenariobest.user_id AND e.scenario_id = scenariobest.scenario_id AND e.score = scenariobest.score
+           )""",
+    ])
+    async with AsyncSession(bind=conn, expire_on_commit=False) as session:
+        scenario_ids = (await session.execute(text("SELECT DISTINCT scenario_id FROM scenariobest"))).scalars().all()
+        for scenario_id in scenario_ids:
+            await rebuild_sketch(session, scenario_id)
+        await session.flush()
+
+async def backfill_watermarks(conn: AsyncConnection) -> None:
+    """Fills syncwatermark and scenariowatermark from the newest stored run of every user (and scenario)."""
+    greatest = "GREATEST" if conn.dialect.name == "postgresql" else "MAX"
+    await execute_all(conn, [
+        f"""INSERT INTO scenariowatermark (user_id, scenario_id, ctime)
+            SELECT user_id, scenario_id, MAX(ctime) FROM entry
+            WHERE user_id IS NOT NULL AND ctime IS NOT NULL
+            GROUP BY user_id, scenario_id
+            ON CONFLICT (user_id, scenario_id) DO UPDATE SET ctime = {greatest}(scenariowatermark.ctime, excluded.ctime)""",
+        f"""INSERT INTO syncwatermark (user_id, ctime)
+            SELECT user_id, MAX(ctime) FROM scenariowatermark WHERE true
+            GROUP BY user_id
+            ON CONFLICT (user_id) DO UPDATE SET ctime = {greatest}(syncwatermark.ctime, excluded.ctime)""",
+    ])
+
+async def sync_revision(conn: AsyncConnection) -> None:
+    """syncwatermark gains the revision and updated_at columns that validate cached reads."""
+    columns = await table_columns(conn, "syncwatermark")
+    if "revision" in columns:
+        return
+    timestamp = "TIMESTAMP WITH TIME ZONE" if conn.dialect.name == "postgresql" else "DATETIME"
+    await execute_all(conn, [
+        "ALTER TABLE syncwatermark ADD COLUMN revision INTEGER NOT NULL DEFAULT 0",
+        f"ALTER TABLE syncwatermark ADD COLUMN updated_at {timestamp}",
+    ])
+
+MIGRATIONS = {
+    "entry_ctime" : entry_ctime,
+    "normalize_entries" : normalize_entries,
+    "backfill_daily_best" : backfill_daily_best,
+    "backfill_scenario_best" : backfill_scenario_best,
+    "backfill_watermarks" : backfill_watermarks,
+    "sync_revision" : sync_revision,
+}
+
+async def run(names: list[str]) -> None:
+    await create_db_and_tables()
+    for name in names:
+        print(f"Running {name}...")
+        async with engine.begin() as conn:
+            await MIGRATIONS[name](conn)
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(run(sys.argv[1:] or list(MIGRATIONS)))
@@ -0,0 +1,51 @@
+import os
+import json
+from typing import Awaitable, Callable
+
+from fastapi.responses import Response
+
+from cache import LocalBackend, RedisBackend, ResponseCache
+
+# ----------------------------------------- CONFIG -----------------------------------------
+
+# Empty or memory:// keeps responses in this process; redis:// (or rediss://) shares them between workers.
+RESPONSE_CACHE_URL = os.environ.get("RESPONSE_CACHE_URL", "")
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", 2_000))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", 600))
+# Total size of the in-process backend. Bodies over the entry limit, such as long unpaginated
+# histories, are served without being stored, whichever the backend.
+RESPONSE_CACHE_BYTES = int(os.environ.get("RESPONSE_CACHE_BYTES", 256 * 2**20))
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRY_BYTES", 2 * 2**20))
+
+# ----------------------------------------- STATE -----------------------------------------
+
+if RESPONSE_CACHE_URL.startswith(("redis://", "rediss://", "unix://")):
+    response_cache = ResponseCache(RedisBackend(RESPONSE_CACHE_URL, ttl=RESPONSE_CACHE_TTL), max_entry_bytes=RESPONSE_CACHE_MAX_ENTRY_BYTES)
+else:
+    response_cache = ResponseCache(
+        LocalBackend(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, maxbytes=RESPONSE_CACHE_BYTES),
+        max_entry_bytes=RESPONSE_CACHE_MAX_ENTRY_BYTES,
+    )
+
+# ----------------------------------------- HELPER FUNCTIONS -----------------------------------------
+
+def pack(response: Response) -> bytes:
+    headers = {key : value for key, value in response.headers.items() if key != "content-length"}
+    return json.dumps({"status" : response.status_code, "media_type" : response.media_type, "headers" : headers}).encode() + b"\n" + response.body
+
+def unpack(value: bytes) -> Response:
+    head, body = value.split(b"\n", 1)
+    head = json.loads(head)
+    return Response(body, status_code=head["status"], media_type=head["media_type"], headers=head["headers"])
+
+async def cached_response(key: str, build: Callable[[], Awaitable[Response]]) -> Response:
+    """The response stored under `key`, built once by `build` on a miss.
+
+    Only fully buffered responses can be stored; errors raised by `build` are not cached.
+    """
+    async def compute() -> bytes:
+        return pack(await build())
+    return unpack(await response_cache.get_or_compute(key, compute))
+
+def json_response(model) -> Response:
+    return Response(model.model_dump_json().encode(), media_type="application/json")
@@ -0,0 +1,215 @@
+import os
+import math
+import asyncio
+import logging
+import datetime
+
+import numpy as np
+from sqlalchemy import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import engine, ScenarioBest, ScenarioSketch
+from cache import TTLCache
+
+# ----------------------------------------- CONFIG -----------------------------------------
+
+SKETCH_COMPRESSION = float(os.environ.get("SKETCH_COMPRESSION", 200))
+# Improving a best adds the new score but cannot take the old one out; past this share of
+# superseded values the sketch gets rebuilt from ScenarioBest.
+SKETCH_MAX_STALE_RATIO = float(os.environ.get("SKETCH_MAX_STALE_RATIO", 0.1))
+
+digest_cache = TTLCache(maxsize=4_096, ttl=float(os.environ.get("SKETCH_CACHE_TTL", 30)))
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------- STATE -----------------------------------------
+
+# Committed best improvements not yet merged into ScenarioSketch, by scenario id.
+pending_bests: dict[int, list[tuple[float | None, float]]] = {}
+flush_task: asyncio.Task | None = None
+
+# ----------------------------------------- T-DIGEST -----------------------------------------
+
+class TDigest:
+    """Merging t-digest (Dunning & Ertl) with the arcsine scale function.
+
+    Centroids stay small near both tails, so extreme quantiles are the most accurate ones.
+    Digests built from disjoint data merge into a digest of their union.
+    """
+
+    def __init__(self, compression: float = SKETCH_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer_means: list[float] = []
+        self._buffer_weights: list[float] = []
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum()) + sum(self._buffer_weights)
+
+    def add(self, values, weights=None) -> None:
+        values = np.asarray(values, dtype=float).ravel()
+        if values.size == 0:
+            return
+        weights = np.ones_like(values) if weights is None else np.asarray(weights, dtype=float).ravel()
+        self._buffer_means.extend(values.tolist())
+        self._buffer_weights.extend(weights.tolist())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        if len(self._buffer_means) > 10 * self.compression:
+            self._compress()
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        other._compress()
+        self.add(other.means, other.weights)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def _k(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _k_inverse(self, k: float) -> float:
+        return (math.sin(min(k * 2 * math.pi / self.compression, math.pi / 2)) + 1) / 2
+
+    def _compress(self) -> None:
+        if not self._buffer_means:
+            return
+        means = np.concatenate((self.means, self._buffer_means))
+        weights = np.concatenate((self.weights, self._buffer_weights))
+        self._buffer_means, self._buffer_weights = [], []
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+
+        new_means, new_weights = [], []
+        merged_weight = 0.0
+        limit = self._k_inverse(self._k(0.0) + 1) * total
+        mean, weight = means[0], weights[0]
+        for m, w in zip(means[1:].tolist(), weights[1:].tolist()):
+            if merged_weight + weight + w <= limit:
+                weight += w
+                mean += (m - mean) * w / weight
+            else:
+                new_means.append(mean)
+                new_weights.append(weight)
+                merged_weight += weight
+                limit = self._k_inverse(self._k(merged_weight / total) + 1) * total
+                mean, weight = m, w
+        new_means.append(mean)
+        new_weights.append(weight)
+        self.means, self.weights = np.array(new_means), np.array(new_weights)
+
+    def _curve(self) -> tuple[np.ndarray, np.ndarray]:
+        # Piecewise-linear CDF through the centroid centres, pinned to the exact min and max.
+        self._compress()
+        centres = np.cumsum(self.weights) - self.weights / 2
+        positions = np.concatenate(([0.0], centres, [self.weights.sum()]))
+        points = np.concatenate(([self.min], self.means, [self.max]))
+        return positions, points
+
+    def quantile(self, q):
+        if self.count == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else math.nan
+        positions, points = self._curve()
+        return np.interp(np.asarray(q) * positions[-1], positions, points)
+
+    def cdf(self, x):
+        if self.count == 0:
+            return np.full(np.shape(x), np.nan) if np.ndim(x) else math.nan
+        positions, points = self._curve()
+        return np.interp(x, points, positions) / positions[-1]
+
+    def to_bytes(self) -> bytes:
+        self._compress()
+        header = [self.compression, self.min, self.max]
+        return np.concatenate((header, self.means, self.weights)).astype("<f8").tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TDigest":
+        values = np.frombuffer(data, dtype="<f8")
+        digest = cls(compression=float(values[0]))
+        digest.min, digest.max = float(values[1]), float(values[2])
+        centroids = values[3:].reshape(2, -1)
+        digest.means, digest.weights = centroids[0].copy(), centroids[1].copy()
+        return digest
+
+# ----------------------------------------- STORAGE -----------------------------------------
+
+def record_bests(improved: list[tuple[int, float | None, float]]) -> None:
+    """Queues committed personal-best improvements, as (scenario_id, previous, new), for the scenario sketches.
+
+    Uploads do not touch the sketch rows themselves: a background flush merges every queued
+    change of a scenario in one short transaction, so a popular scenario's row is never held
+    locked for the length of an ingest.
+    """
+    global flush_task
+    for scenario_id, previous, score in improved:
+        pending_bests.setdefault(scenario_id, []).append((previous, score))
+    if flush_task is None or flush_task.done():
+        flush_task = asyncio.get_running_loop().create_task(flush_bests())
+
+async def apply_bests(session: AsyncSession, scenario_id: int, changes: list[tuple[float | None, float]]) -> None:
+    # The row is locked so concurrent workers merge instead of overwriting each other.
+    row = (await session.execute(select(ScenarioSketch).where(ScenarioSketch.scenario_id == scenario_id).with_for_update())).scalar()
+    if row is None:
+        row = ScenarioSketch(scenario_id=scenario_id, users=0, stale=0)
+        digest = TDigest()
+    else:
+        digest = TDigest.from_bytes(row.digest)
+    digest.add([score for _, score in changes])
+    row.digest = digest.to_bytes()
+    row.users += sum(1 for previous, _ in changes if previous is None)
+    row.stale += sum(1 for previous, _ in changes if previous is not None)
+    row.updated_at = datetime.datetime.now(datetime.UTC)
+    session.add(row)
+
+async def flush_bests() -> None:
+    while pending_bests:
+        batch = dict(pending_bests)
+        pending_bests.clear()
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            for scenario_id in sorted(batch):
+                try:
+                    await apply_bests(session, scenario_id, batch[scenario_id])
+                    await session.commit()
+                except Exception:
+                    await session.rollback()
+                    logger.exception("Updating the sketch of scenario %s failed", scenario_id)
+                    # Kept for the next flush, which the next improving upload starts.
+                    for key, changes in batch.items():
+                        pending_bests.setdefault(key, []).extend(changes)
+                    return
+                del batch[scenario_id]
+                digest_cache.pop(scenario_id)
+
+async def rebuild_sketch(session: AsyncSession, scenario_id: int) -> None:
+    scores = (await session.execute(select(ScenarioBest.score).where(ScenarioBest.scenario_id == scenario_id))).scalars().all()
+    digest = TDigest()
+    digest.add(scores)
+    row = await session.get(ScenarioSketch, scenario_id, with_for_update=True) or ScenarioSketch(scenario_id=scenario_id)
+    row.digest = digest.to_bytes()
+    row.users = len(scores)
+    row.stale = 0
+    row.updated_at = datetime.datetime.now(datetime.UTC)
+    session.add(row)
+    digest_cache.pop(scenario_id)
+
+async def rebuild_stale_sketches(session: AsyncSession) -> None:
+    stale = select(ScenarioSketch.scenario_id).where(ScenarioSketch.stale > ScenarioSketch.users * SKETCH_MAX_STALE_RATIO)
+    for scenario_id in (await session.execute(stale)).scalars().all():
+        await rebuild_sketch(session, scenario_id)
+        await session.commit()
+
+async def load_digest(session: AsyncSession, scenario_id: int) -> tuple[TDigest, ScenarioSketch] | None:
+    cached = digest_cache.get(scenario_id)
+    if cached is None:
+        row = await session.get(ScenarioSketch, scenario_id)
+        if row is None:
+            return None
+        cached = TDigest.from_bytes(row.digest), row
+        digest_cache.set(scenario_id, cached)
+    return cached
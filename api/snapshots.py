@@ -0,0 +1,186 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import datetime
+
+import numpy as np
+from pydantic import BaseModel
+from sqlalchemy import bindparam, text
+from sqlmodel import select
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import engine, Entry, Scenario
+from sketch import rebuild_stale_sketches
+from leaderboard import get_energy_ranking
+from benchmarks import Benchmark, all_benchmarks
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------- CONFIG -----------------------------------------
+
+# Percentiles are recomputed every PERCENTILE_REFRESH_SECONDS, or sooner once PERCENTILE_REFRESH_INSERTS runs came in.
+PERCENTILE_REFRESH_SECONDS = float(os.environ.get("PERCENTILE_REFRESH_SECONDS", 600))
+PERCENTILE_REFRESH_INSERTS = int(os.environ.get("PERCENTILE_REFRESH_INSERTS", 5_000))
+
+DISTRIBUTION_BINS = int(os.environ.get("DISTRIBUTION_BINS", 100))
+# Distributions are built from the live energy rankings on request, then rebuilt once older than this.
+DISTRIBUTION_MAX_AGE = float(os.environ.get("DISTRIBUTION_MAX_AGE", 60))
+
+# percentile_cont and generate_series are PostgreSQL's: other databases get the scores and
+# interpolate them the same way here.
+
+PERCENTILES_QUERY = text("""WITH percentiles AS (
+                SELECT generate_series(1, 100) AS percentile
+                )
+
+                SELECT
+                p.percentile,
+                percentile_cont(p.percentile / 100.0) WITHIN GROUP (ORDER BY e.score) AS score_percentile,
+                s.hash as hash
+
+                FROM
+                percentiles p
+                CROSS JOIN
+                entry e
+                JOIN
+                scenario s ON s.id = e.scenario_id
+
+                WHERE
+                s.hash IN :hashes
+
+                GROUP BY
+                p.percentile, s.hash
+                
+                ORDER BY
+                p.percentile;""").bindparams(bindparam("hashes", expanding=True))
+
+# ----------------------------------------- MODELS -----------------------------------------
+
+class PercentileSnapshot(BaseModel):
+    version: str
+    computed_at: datetime.datetime
+    percentiles: dict[str, list[dict[str, float]]]
+
+class EnergyDistribution(BaseModel):
+    version: str
+    computed_at: datetime.datetime
+    max_age: float # Seconds after computed_at within which inserts may not be counted yet
+    players: int
+    edges: list[float]
+    counts: list[int]
+    density: list[float]
+
+# ----------------------------------------- STATE -----------------------------------------
+
+percentile_snapshots: dict[tuple[str, int, str], PercentileSnapshot] = {}
+energy_distributions: dict[tuple[str, int, str], EnergyDistribution] = {}
+refresh_lock = asyncio.Lock()
+refresh_requested = asyncio.Event()
+inserts_since_refresh = 0
+
+# ----------------------------------------- HELPER FUNCTIONS -----------------------------------------
+
+def record_inserts(count: int) -> None:
+    global inserts_since_refresh
+    inserts_since_refresh += count
+    if inserts_since_refresh >= PERCENTILE_REFRESH_INSERTS:
+        refresh_requested.set()
+
+def interpolated_percentiles(rows) -> dict[str, list[dict[str, float]]]:
+    """Percentiles 1-100 of every hash's scores from (hash, score) rows, interpolated as percentile_cont does."""
+    scores: dict[str, list[float]] = {}
+    for hash_, score in rows:
+        scores.setdefault(hash_, []).append(score)
+    levels = np.arange(1, 101)
+    return {
+        hash_ : [{"percentile" : int(level), "score" : float(score)} for level, score in zip(levels, np.percentile(values, levels))]
+        for hash_, values in scores.items()
+    }
+
+async def compute_percentiles(hashes: list[str]) -> PercentileSnapshot:
+    async with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            result = await conn.execute(PERCENTILES_QUERY, {"hashes" : hashes})
+            percentiles: dict[str, list[dict[str, float]]] = {}
+            for percentile, score, hash_ in result:
+                percentiles.setdefault(hash_, []).append({"percentile" : percentile, "score" : score})
+        else:
+            query = select(Scenario.hash, Entry.score).join(Scenario, Entry.scenario_id == Scenario.id).where(Scenario.hash.in_(hashes))
+            percentiles = interpolated_percentiles(await conn.execute(query))
+    # Derived from the content, so every worker hands out the same version for the same data.
+    version = hashlib.sha1(json.dumps(percentiles, sort_keys=True).encode()).hexdigest()[:16]
+    return PercentileSnapshot(version=version, computed_at=datetime.datetime.now(datetime.UTC), percentiles=percentiles)
+
+async def refresh_percentiles() -> None:
+    global inserts_since_refresh
+    async with refresh_lock:
+        inserts_since_refresh = 0
+        refresh_requested.clear()
+        for benchmark in all_benchmarks():
+            percentile_snapshots[benchmark.key] = await compute_percentiles(benchmark.hashes)
+
+async def get_percentile_snapshot(benchmark: Benchmark) -> PercentileSnapshot:
+    snapshot = percentile_snapshots.get(benchmark.key)
+    if snapshot is None:
+        # Only until the first background refresh has landed; concurrent callers share it.
+        async with refresh_lock:
+            snapshot = percentile_snapshots.get(benchmark.key)
+            if snapshot is None:
+                snapshot = await compute_percentiles(benchmark.hashes)
+                percentile_snapshots[benchmark.key] = snapshot
+    return snapshot
+
+def smoothed_density(counts: np.ndarray, width: float, std: float) -> np.ndarray:
+    """Gaussian KDE evaluated at the bin centres, from the histogram (Scott's bandwidth)."""
+    players = counts.sum()
+    if players == 0:
+        return np.zeros(len(counts))
+    sigma = 1.06 * std * players ** (-1 / 5) / width
+    if sigma < 1e-3:
+        return counts / (players * width)
+    offsets = np.arange(-int(np.ceil(4 * sigma)), int(np.ceil(4 * sigma)) + 1)
+    kernel = np.exp(-0.5 * (offsets / sigma) ** 2)
+    return np.convolve(counts, kernel / kernel.sum(), mode="same") / (players * width)
+
+async def compute_distribution(session: AsyncSession, benchmark: Benchmark) -> EnergyDistribution:
+    ranking = await get_energy_ranking(session, benchmark)
+    energies = np.fromiter(ranking.values.values(), dtype=float, count=len(ranking))
+    edges = np.linspace(0, benchmark.energy_table.max_energy, DISTRIBUTION_BINS + 1)
+    counts, _ = np.histogram(np.clip(energies, edges[0], edges[-1]), bins=edges)
+    density = smoothed_density(counts, edges[1] - edges[0], float(energies.std()) if len(energies) else 0.0)
+    version = hashlib.sha1(counts.tobytes() + edges.tobytes()).hexdigest()[:16]
+    return EnergyDistribution(
+        version=version,
+        computed_at=datetime.datetime.now(datetime.UTC),
+        max_age=DISTRIBUTION_MAX_AGE,
+        players=len(energies),
+        edges=edges.tolist(),
+        counts=counts.tolist(),
+        density=density.tolist(),
+    )
+
+async def get_energy_distribution(session: AsyncSession, benchmark: Benchmark) -> EnergyDistribution:
+    # Binning the maintained ranking is cheap; only a cold ranking reads the database.
+    distribution = energy_distributions.get(benchmark.key)
+    if distribution is None or datetime.datetime.now(datetime.UTC) - distribution.computed_at > datetime.timedelta(seconds=DISTRIBUTION_MAX_AGE):
+        distribution = energy_distributions[benchmark.key] = await compute_distribution(session, benchmark)
+    return distribution
+
+async def refresh_snapshots_forever() -> None:
+    while True:
+        try:
+            await refresh_percentiles()
+        except Exception:
+            logger.exception("Refreshing percentile snapshots failed")
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                await rebuild_stale_sketches(session)
+        except Exception:
+            logger.exception("Rebuilding scenario sketches failed")
+        try:
+            await asyncio.wait_for(refresh_requested.wait(), PERCENTILE_REFRESH_SECONDS)
+        except TimeoutError:
+            pass
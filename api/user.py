@@ -2,21 +2,32 @@ from fastapi import status
 from fastapi.routing import APIRouter
 from fastapi.exceptions import HTTPException
 
+from sqlalchemy import event, inspect
 from sqlmodel import select
 
 
 from database import User, SessionDep
+from response_cache import response_cache, cached_response, json_response
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def invalidate_cached_profile(mapper, connection, target: User):
+    response_cache.invalidate(f"user:{target.username}")
+    for old_username in inspect(target).attrs.username.history.deleted:
+        response_cache.invalidate(f"user:{old_username}")
 
 user_router = APIRouter(prefix="/user", tags=["User"])
 
 @user_router.get("/{username}")
 async def get_user(username: str, session: SessionDep) -> User:
-    user_query = select(User).where(User.username == username)
-    maybe_user = session.exec(user_query).first()
-    if maybe_user is None:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, f"Username {username} does not exist")
-    maybe_user.hashed_passwd = "REDACTED"
-    return maybe_user
+    async def build():
+        user_query = select(User).where(User.username == username)
+        maybe_user = (await session.exec(user_query)).first()
+        if maybe_user is None:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, f"Username {username} does not exist")
+        maybe_user.hashed_passwd = "REDACTED"
+        return json_response(maybe_user)
+    return await cached_response(f"user:{username}", build)
 
 @user_router.get("/{username}")
 async def initiate_verification_process(username: str):
@@ -1,64 +0,0 @@
-VOLTAIC = {
-    5 : {
-        "novice" :{
-            "82348b2df5422561f8763e0057256556" : (555, 660, 745, 800), # PASU
-            "045398ef32a43c9c003be756b7901529" : (390, 500, 600, 720), # POPCORN
-            "244bdf9e81bb8b1110065790506945f7" : (820, 915, 1010, 1110), # 1W4TS
-            "795226c63d1793e92980e368eb766d1c" : (990, 1090, 1190, 1290), # WW5T
-            "da3e0e273d87fc40b8c9d0068705a68a" : (620, 740, 850, 980), # FROGTAGON
-            "0b3a86506eba1647314704c9de97e58f" : (375, 460, 540, 640), # FLOATING HEADS
-            "4bc4e30ba994022bc44323bd062d23f3" : (1900, 2325, 2775, 3050), # PGT
-            "27470ae58afab12b791efe3a807032f4" : (2400, 2750, 3125, 3425), # SNAKE TRACK
-            "16dbf7fd81c234bdd13c7e645c115596" : (1525, 1900, 2250, 2650), # AETHER
-            "406158184e375fce885f1f143696764c" : (2100, 2500, 2825, 3100), # GROUND
-            "161d3985469c9306b071bdb593614d50" : (2125, 2550, 2975, 3450), # RAW CONTROL
-            "6c2883eb0a9f4043c5980224745e94ce" : (1575, 1950, 2400, 2900), # CONTROLSPHERE
-            "df276a45969aca3c6f0111ff73c7c922" : (845, 940, 1030, 1090), # DOT TS
-            "c4b5014ef40a672a8e82bfede2ed7954" : (640, 730, 810, 890), # EDDIE TS
-            "806280235094ef04c655d652ae9d4051" : (315, 355, 390, 430), # DRIFT TS
-            "50f9141b3b6c6408385b41be7a4e6704" : (420, 460, 500, 535), # FLY TS
-            "299decbee22420a1682c7da113681b13" : (340, 380, 420, 450), # CONTROL TS
-            "86206de1ceb71ac45e173ab12fee7646" : (290, 340, 390, 445), # PENTA BOUNCE
-        },
-        "intermediate" : {
-            "830238e82c367ad2ba40df1da9968131" : (770, 850, 930, 980), # PASU
-            "86f9526f57828ad981f6c93b35811f94" : (600, 690, 780, 860), # POPCORN
-            "37975ba4bbbd5f9c593e7dbd72794baa" : (1120, 1220, 1300, 1380), # 1W3TS
-            "5c7668cf07b550bb2b7956f5709cf84e" : (1310, 1400, 1490, 1560), # WW5T
-            "ec8acdea37fa767767d705e389db1463" : (940, 1040, 1140, 1230), # FROGTAGON
-            "47124ba125c1807fc7deb011c2f545a7" : (610, 690, 770, 860), # FLOATING HEADS
-            "b11e423dba738357ce774a01422e9d91" : (2275, 2675, 3050, 3325), # PGT
-            "ff38084d283c4e285150faee9c6b2832" : (2800, 3175, 3500, 3750), # SNAKE TRACK
-            "c4c11bf8a727b6e6c836138535bd0879" : (2175, 2550, 2900, 3175), # AETHER
-            "489b27e681807e0212eef50241bb0769" : (2550, 2850, 3100, 3350), # GROUND
-            "865d54422da5368dc290d1bbc2b9b566" : (2775, 3200, 3550, 3875), # RAW CONTROL
-            "a5fa9fbc3d55851b11534c60b85a9247" : (2750, 3175, 3525, 3825), # CONTROLSPHERE
-            "dfb397975f6fcec5bd2ebf3cd0b7a66a" : (1110, 1180, 1230, 1280), # DOT TS
-            "03d6156260b1b2b7893b746354b889c2" : (880, 950, 1020, 1080), # EDDIE TS
-            "ff777f42a21d6ddcf8791caf2821a2bd" : (390, 430, 460, 490), # DRIFT TS
-            "138c732d61151697949af4a3f51311fa" : (520, 570, 610, 650), # FLY TS
-            "e3b4fdab121562a8d4c8c2ac426c890c" : (420, 460, 485, 520), # CONTROL TS
-            "7cd5eee66632ebec0c33218d218ebf95" : (450, 490, 540, 580), # PENTA BOUNCE
-        },
-        "advanced" : {
-            "c31be0039b0f21b7294e0bb6d89c6df0" : (910, 1020, 1110, 1240), # PASU
-            "8de94615187dbe31818e105c569548fd" : (680, 800, 910, 1020), # POPCORN
-            "82b54d0e4727d06036d27f83ee2de893" : (1320, 1420, 1520, 1620), # 1W2TS
-            "4feccb9eba723a1592d25fc385499d6f" : (1510, 1610, 1720, 1860), # WW5T
-            "a50a0c29ba4b86f47c4c446d8ed97156" : (1090, 1220, 1360, 1490), # FROGTAGON
-            "594a057e7607be59ff7f52230f3ec9f9" : (740, 830, 920, 1050), # FLOATING HEADS
-            "4a7eabf5fce5441d136802764e1db34a" : (2750, 3175, 3625, 4050), # PGT
-            "c6ce04a85ad4cea7cbce9964d496bb50" : (3050, 3425, 3725, 4050), # SNAKE TRACK
-            "a23f37408022e722bd1893793125388d" : (2750, 3175, 3525, 3825), # AETHER
-            "7e09e17f08ebd6f28ba838cac836e5ea" : (2875, 3200, 3500, 3725), # GROUND
-            "5416e5f54286c4be7eece8e8d8ac624c" : (3150, 3550, 3875, 4250), # RAW CONTROL
-            "52a076346df8d7fa588f4f1fb0501266" : (3100, 3550, 3875, 4250), # CONTROLSPHERE
-            "e42c0bdc3bf99978bdef01992c8cff05" : (1280, 1360, 1420, 1500), # DOT TS
-            "10838602736abdcd06f394c37db50642" : (1020, 1120, 1200, 1280), # EDDIE TS
-            "4d5626939cc35aa15284cba2bcefeb6d" : (430, 470, 510, 540), # DRIFT TS
-            "f69848a1c18ccb7376cc29c8b983ba7b" : (540, 600, 660, 720), # FLY TS
-            "adf1bc9f310106ba19894cb52f8a8478" : (450, 490, 520, 550), # CONTROL TS
-            "2ab3238b5a414e4e7aff67771608be1b" : (530, 580, 630, 670), # PENTA BOUNCE
-        }
-    }
-}
\ No newline at end of file
@@ -0,0 +1,63 @@
+"""Dashboard energy mapping: per-score Benchmark.get_energy against the vectorised get_energies.
+
+    python scripts/energy_benchmark.py [--scores 5000000] [--scalar 200000] [--season 5] [--difficulty advanced]
+
+The scalar path is timed on the first --scalar scores and scaled to the full count; both paths
+are checked to give identical energies on those scores.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "streamlit"))
+
+from benchmarks import Benchmark
+
+BENCHMARKS_FILE = os.path.join(os.path.dirname(__file__), os.pardir, "api", "data", "benchmarks.json")
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument("--scores", type=int, default=5_000_000)
+parser.add_argument("--scalar", type=int, default=200_000, help="scores timed through get_energy")
+parser.add_argument("--season", default="5")
+parser.add_argument("--difficulty", default="advanced")
+arguments = parser.parse_args()
+
+def load_benchmark() -> Benchmark:
+    with open(BENCHMARKS_FILE) as file:
+        spec = json.load(file)["vt"]["seasons"][arguments.season][arguments.difficulty]
+    thresholds = {scenario["hash"] : scenario["thresholds"] for scenario in spec["scenarios"]}
+    return Benchmark(thresholds=thresholds, energy_thresholds=spec["energy_thresholds"])
+
+if __name__ == "__main__":
+    benchmark = load_benchmark()
+    rng = np.random.default_rng(0)
+    codes = rng.integers(len(benchmark.hashes), size=arguments.scores)
+    top = np.array([benchmark.thresholds[hash_][3] for hash_ in benchmark.hashes], dtype=float)
+    # From below the first threshold to well past the last one, with some unplayed (NaN) cells.
+    scores = rng.uniform(-0.1, 1.4, arguments.scores) * top[codes]
+    scores[rng.random(arguments.scores) < 0.01] = np.nan
+    hashes = np.asarray(benchmark.hashes)[codes]
+    print(f"vt s{arguments.season} {arguments.difficulty}: {arguments.scores:,} scores over {len(benchmark.hashes)} scenarios")
+
+    start = time.perf_counter()
+    hash_codes = benchmark.hash_codes(hashes)
+    lookup = time.perf_counter() - start
+    start = time.perf_counter()
+    energies = benchmark.get_energies(scores, hash_codes)
+    vectorised = time.perf_counter() - start
+
+    sample = min(arguments.scalar, arguments.scores)
+    sample_scores, sample_hashes = scores[:sample].tolist(), hashes[:sample].tolist()
+    start = time.perf_counter()
+    expected = [benchmark.get_energy(score, hash_) for score, hash_ in zip(sample_scores, sample_hashes)]
+    scalar = (time.perf_counter() - start) * arguments.scores / sample
+
+    np.testing.assert_array_equal(energies[:sample], expected)
+    print(f"  get_energy (scaled from {sample:,}) {scalar:8.2f} s  {scalar / arguments.scores * 1e9:8.1f} ns/score")
+    print(f"  hash_codes                        {lookup:8.2f} s  {lookup / arguments.scores * 1e9:8.1f} ns/score")
+    print(f"  get_energies                      {vectorised:8.2f} s  {vectorised / arguments.scores * 1e9:8.1f} ns/score")
+    print(f"  speedup {scalar / (lookup + vectorised):.0f}x with code lookup, {scalar / vectorised:.0f}x without; identical on the sample")
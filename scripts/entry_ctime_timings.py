@@ -0,0 +1,105 @@
+"""Query plans and timings of the entry reads before and after the `entry_ctime` migration.
+
+    python scripts/entry_ctime_timings.py [--users 1000] [--runs 3000] [--path /tmp/entry_ctime.db]
+
+Seeds a SQLite database with the original entry schema (VARCHAR ctime, single-column indexes),
+times the history and latest-timestamp queries, applies the migration and times them again.
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import asyncio
+import argparse
+import statistics
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument("--users", type=int, default=1_000)
+parser.add_argument("--runs", type=int, default=3_000, help="runs per user")
+parser.add_argument("--path", default="/tmp/entry_ctime.db")
+arguments = parser.parse_args()
+
+if os.path.exists(arguments.path):
+    os.remove(arguments.path)
+os.environ["DATABASE_URL"] = "sqlite:///" + arguments.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "api"))
+
+from database import engine
+from migrations import entry_ctime
+
+HASHES = [f"{i:032x}" for i in range(54)]
+BENCHMARK = HASHES[:18]
+START = 1_650_000_000 * 10**9
+SPAN = 400 * 86_400 * 10**9
+
+# What the ORM sent for /entry/me/vt-s5-.../{from}..{to} and /me/latest-entry-timestamp.
+HISTORY = f"SELECT * FROM entry WHERE user_id = ? AND hash IN ({', '.join('?' * len(BENCHMARK))}) AND ctime >= ? AND ctime <= ?"
+LATEST = "SELECT * FROM entry WHERE user_id = ? ORDER BY ctime DESC LIMIT 1"
+
+def seed(connection: sqlite3.Connection) -> None:
+    connection.executescript("""
+        CREATE TABLE user (id INTEGER NOT NULL PRIMARY KEY);
+        CREATE TABLE entry (
+            id INTEGER NOT NULL PRIMARY KEY,
+            user_id INTEGER REFERENCES user (id),
+            scenario VARCHAR, hash VARCHAR NOT NULL, score FLOAT, ctime VARCHAR,
+            sens_scale VARCHAR, sens_increment FLOAT, dpi INTEGER, fov_scale VARCHAR, fov INTEGER
+        );
+    """)
+    rng = random.Random(0)
+    connection.executemany("INSERT INTO user (id) VALUES (?)", ((user_id,) for user_id in range(1, arguments.users + 1)))
+    connection.executemany(
+        "INSERT INTO entry (user_id, scenario, hash, score, ctime, sens_scale, sens_increment, dpi, fov_scale, fov) VALUES (?, ?, ?, ?, ?, 'cm', 0.1, 800, 'ow', 103)",
+        (
+            (user_id, f"S{h}", HASHES[h], rng.uniform(100, 3000), str(START + rng.randrange(SPAN)))
+            for user_id in range(1, arguments.users + 1)
+            for h in (rng.randrange(len(HASHES)) for _ in range(arguments.runs))
+        ),
+    )
+    connection.executescript("""
+        CREATE INDEX ix_entry_hash ON entry (hash);
+        CREATE INDEX ix_entry_ctime ON entry (ctime);
+        ANALYZE;
+    """)
+    connection.commit()
+
+def measure(connection: sqlite3.Connection, label: str) -> None:
+    rng = random.Random(1)
+    queries = {
+        "history (30 days)" : lambda user_id: (HISTORY, (user_id, *BENCHMARK, START + SPAN - 30 * 86_400 * 10**9, START + SPAN)),
+        "history (all)" : lambda user_id: (HISTORY, (user_id, *BENCHMARK, START, START + SPAN)),
+        "latest timestamp" : lambda user_id: (LATEST, (user_id,)),
+    }
+    print(f"\n{label}")
+    for name, query in queries.items():
+        sql, parameters = query(1)
+        plan = "; ".join(row[-1] for row in connection.execute("EXPLAIN QUERY PLAN " + sql, parameters))
+        timings = []
+        for _ in range(50):
+            sql, parameters = query(rng.randint(1, arguments.users))
+            start = time.perf_counter()
+            connection.execute(sql, parameters).fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"  {name:18} median {statistics.median(timings):8.2f} ms  max {max(timings):8.2f} ms  plan: {plan}")
+
+async def migrate() -> float:
+    start = time.perf_counter()
+    async with engine.begin() as conn:
+        await entry_ctime(conn)
+    await engine.dispose()
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    connection = sqlite3.connect(arguments.path)
+    start = time.perf_counter()
+    seed(connection)
+    print(f"seeded {arguments.users * arguments.runs:,} runs in {time.perf_counter() - start:.1f}s")
+    measure(connection, "before (VARCHAR ctime, ix_entry_hash, ix_entry_ctime)")
+    connection.close()
+
+    print(f"\nmigration took {asyncio.run(migrate()):.1f}s")
+
+    connection = sqlite3.connect(arguments.path)
+    connection.execute("ANALYZE")
+    measure(connection, "after (BIGINT ctime, ix_entry_user_id_hash_ctime, ix_entry_user_id_ctime)")
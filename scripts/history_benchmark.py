@@ -0,0 +1,98 @@
+"""Dashboard energy progress: wall time and peak traced memory of history.energy_progress on a synthetic history.
+
+    python scripts/history_benchmark.py [--runs 1000000] [--days 580] [--difficulty novice] [--previous] [--chart]
+
+--previous also times the per-scenario pipeline show_season ran before energy_progress and
+checks that both give the same frame. --chart plots the per-run energies with plotly, in full
+and downsampled to --budget points, and compares figure size and the time to downsample,
+build and serialize it.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "streamlit"))
+
+from benchmarks import Benchmark
+from history import energy_progress, downsample
+
+BENCHMARKS_FILE = os.path.join(os.path.dirname(__file__), os.pardir, "api", "data", "benchmarks.json")
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument("--runs", type=int, default=1_000_000)
+parser.add_argument("--days", type=int, default=580)
+parser.add_argument("--season", default="5")
+parser.add_argument("--difficulty", default="novice")
+parser.add_argument("--previous", action="store_true")
+parser.add_argument("--chart", action="store_true")
+parser.add_argument("--budget", type=int, default=1_000)
+arguments = parser.parse_args()
+
+def previous_energy_progress(df, benchmark):
+    df = df.copy()
+    df["ctime"] = df["ctime"].apply(lambda x: datetime.datetime.fromtimestamp(float(x) / 1_000_000_000))
+    dfs = []
+    for hash_ in benchmark.thresholds.keys():
+        df_ = df[df["hash"] == hash_]
+        scores_series = df_.set_index(df_["ctime"]).resample("D")["score"].max().apply(lambda x: benchmark.get_energy(x, hash_))
+        scores_series.name = df_["scenario"].dropna().unique()[0]
+        dfs.append(scores_series)
+    df__ = pd.concat(dfs, axis=1, sort=True).interpolate("linear")
+    series = [df__[col_pair].max(axis=1).cummax() for col_pair in np.reshape(df__.columns, shape=(9, 2))]
+    return pd.concat(series, axis=1).dropna()
+
+def measure(label, function, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  {label:20} {elapsed:8.2f} s  peak {peak / 2**20:8.1f} MiB  {len(result)} days")
+    return result
+
+if __name__ == "__main__":
+    with open(BENCHMARKS_FILE) as file:
+        family = json.load(file)["vt"]
+    spec = family["seasons"][arguments.season][arguments.difficulty]
+    hashes = [scenario["hash"] for scenario in spec["scenarios"]]
+    names = [scenario["name"] for scenario in spec["scenarios"]]
+    thresholds = {scenario["hash"] : scenario["thresholds"] for scenario in spec["scenarios"]}
+    benchmark = Benchmark(thresholds=thresholds, energy_thresholds=spec["energy_thresholds"])
+
+    # Scores drift up over time, as a player improves.
+    rng = np.random.default_rng(0)
+    positions = rng.integers(len(hashes), size=arguments.runs)
+    top = np.array([thresholds[hash_][3] for hash_ in hashes], dtype=float)
+    start = 1_700_000_000 * 10**9
+    df = pd.DataFrame({
+        "scenario" : pd.Categorical.from_codes(positions, names),
+        "hash" : pd.Categorical.from_codes(positions, hashes),
+        "score" : rng.uniform(0, 1.2, arguments.runs) * top[positions] * np.linspace(0.5, 1, arguments.runs),
+        "ctime" : np.sort(start + rng.integers(arguments.days * 86_400 * 10**9, size=arguments.runs)),
+    })
+    print(f"vt s{arguments.season} {arguments.difficulty}: {arguments.runs:,} runs over {arguments.days} days ({time.tzname[0]})")
+
+    result = measure("energy_progress", energy_progress, df, benchmark, family["categories"])
+    if arguments.previous:
+        expected = measure("previous pipeline", previous_energy_progress, df, benchmark)
+        expected.columns = family["categories"]
+        pd.testing.assert_frame_equal(result, expected, check_freq=False, check_names=False, check_index_type=False)
+        print("  same frame")
+    if arguments.chart:
+        import plotly.express as px
+        codes = benchmark.hash_codes(benchmark.hashes)[df["hash"].cat.codes.to_numpy()]
+        series = pd.Series(benchmark.get_energies(df["score"].to_numpy(), codes), index=pd.to_datetime(df["ctime"].to_numpy(), unit="ns"))
+        for label, select in (("full", lambda: series), (f"downsampled to {arguments.budget:,}", lambda: downsample(series, arguments.budget))):
+            start = time.perf_counter()
+            points = select()
+            payload = px.line(x=points.index, y=points.to_numpy()).to_json()
+            elapsed = time.perf_counter() - start
+            print(f"  chart {label:24} {len(points):9,} points  {len(payload) / 2**20:8.2f} MiB  in {elapsed:6.2f} s")
@@ -0,0 +1,107 @@
+"""Leaderboard load: build, update and query latency of the in-process rankings at 100k+ players.
+
+    python scripts/leaderboard_benchmark.py [--users 100000] [--updates 20000] [--queries 20000]
+
+Seeds a throwaway SQLite database with a ScenarioBest row for most (player, scenario) pairs
+of vt s5 advanced, then times:
+    - building one scenario ranking and the overall-energy ranking from the database;
+    - record_bests, the hook applying each committed personal-best improvement;
+    - rank lookups and top-100 pages, on the scenario and energy rankings.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import sqlite3
+import argparse
+import tempfile
+
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(), "leaderboard.db")
+os.environ["DATABASE_URL"] = "sqlite:///" + DATABASE_PATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "api"))
+
+import numpy as np
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import leaderboard
+from benchmarks import find_benchmark
+from database import engine, create_db_and_tables
+
+def seed(path: str, users: int, benchmark) -> None:
+    rng = random.Random(0)
+    with sqlite3.connect(path) as connection:
+        connection.executemany(
+            "INSERT INTO user (id, username, email, hashed_passwd, is_active, is_verified, created_at, updated_at) "
+            "VALUES (?, ?, ?, '', 1, 1, '2024-01-01 00:00:00', '2024-01-01 00:00:00')",
+            ((user_id, f"player{user_id}", f"player{user_id}@example.com") for user_id in range(1, users + 1)),
+        )
+        connection.executemany(
+            "INSERT INTO scenario (id, name, hash) VALUES (?, ?, ?)",
+            ((i + 1, name, hash_) for i, (name, hash_) in enumerate(zip(benchmark.names, benchmark.hashes))),
+        )
+        # Players skill up evenly across scenarios; one in ten skips a given scenario.
+        skills = [rng.lognormvariate(0, 0.25) for _ in range(users)]
+        connection.executemany(
+            "INSERT INTO scenariobest (user_id, scenario_id, score, ctime) VALUES (?, ?, ?, 0)",
+            (
+                (user_id, i + 1, 0.7 * benchmark.thresholds[hash_][1] * skills[user_id - 1] * rng.uniform(0.9, 1.1))
+                for user_id in range(1, users + 1)
+                for i, hash_ in enumerate(benchmark.hashes)
+                if rng.random() < 0.9
+            ),
+        )
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+def report(name: str, seconds: list[float]) -> None:
+    us = np.array(seconds) * 1e6
+    print(f"  {name:34} n={len(us):6}  p50 {np.percentile(us, 50):8.1f} us  p99 {np.percentile(us, 99):8.1f} us  max {us.max():9.1f} us")
+
+async def run(users: int, updates: int, queries: int) -> None:
+    benchmark = find_benchmark("vt", 5, "advanced")
+    await create_db_and_tables()
+    start = time.perf_counter()
+    seed(DATABASE_PATH, users, benchmark)
+    print(f"seeded {users:,} players x {len(benchmark.hashes)} scenarios in {time.perf_counter() - start:.1f}s")
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        start = time.perf_counter()
+        scenario = await leaderboard.get_scenario_ranking(session, 1)
+        scenario_build = time.perf_counter() - start
+        start = time.perf_counter()
+        energy = await leaderboard.get_energy_ranking(session, benchmark)
+        energy_build = time.perf_counter() - start
+    await engine.dispose()
+    print(f"scenario ranking: {len(scenario):,} players, built in {scenario_build:.2f}s")
+    print(f"energy ranking:   {len(energy):,} players, built in {energy_build:.2f}s (including the other {len(benchmark.hashes) - 1} scenario rankings)")
+
+    rng = random.Random(1)
+    hashes = {i + 1 : hash_ for i, hash_ in enumerate(benchmark.hashes)}
+    update_times = []
+    for _ in range(updates):
+        user_id, scenario_id = rng.randint(1, users), rng.randint(1, len(hashes))
+        ranking = leaderboard.scenario_rankings[scenario_id]
+        previous = ranking.values.get(user_id)
+        score = (previous or 0.5 * benchmark.thresholds[hashes[scenario_id]][1]) * rng.uniform(1.0, 1.05)
+        update_times.append(timed(leaderboard.record_bests, user_id, [(scenario_id, previous, score)], hashes))
+
+    print("\nlatency")
+    report("record_bests (scenario + energy)", update_times)
+    user_ids = [rng.randint(1, users) for _ in range(queries)]
+    report("scenario rank of a player", [timed(scenario.rank, user_id) for user_id in user_ids])
+    report("energy rank of a player", [timed(energy.rank, user_id) for user_id in user_ids])
+    report("energy rank of a value", [timed(energy.rank_of, rng.uniform(0, 1_500)) for _ in range(queries)])
+    report("energy top 100, first page", [timed(energy.top, 100, 0) for _ in range(queries // 10)])
+    report("energy top 100, random page", [timed(energy.top, 100, rng.randrange(len(energy))) for _ in range(queries // 10)])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--updates", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=20_000)
+    arguments = parser.parse_args()
+    asyncio.run(run(arguments.users, arguments.updates, arguments.queries))
@@ -0,0 +1,83 @@
+"""Login storm: concurrent /auth/token calls while timing a trivial endpoint on the same event loop.
+
+    python scripts/login_storm.py [--logins 200] [--inline]
+
+--inline runs bcrypt on the event loop (the behaviour before the password pool) for comparison.
+Uses a throwaway SQLite database unless DATABASE_URL is set.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "storm.db"))
+os.environ.setdefault("SECRET_KEY", "login-storm")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "api"))
+
+import httpx
+import numpy as np
+
+import auth
+import main
+from database import create_db_and_tables
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event, latencies: list[float]) -> None:
+    # Each sample is the request plus how late the 10 ms sleep after it ends: a blocked loop shows in both.
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/")
+        await asyncio.sleep(0.01)
+        latencies.append(time.perf_counter() - start - 0.01)
+
+async def storm(logins: int, inline: bool) -> None:
+    if inline:
+        async def run_inline(fn, *args):
+            return fn(*args)
+        auth.run_passwd_job = run_inline
+
+    await create_db_and_tables()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://storm") as client:
+        await client.post("/auth/signup", json={"email" : "storm@example.com", "username" : "storm", "password" : "hunter2"})
+
+        idle: list[float] = []
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(client, stop, idle))
+        await asyncio.sleep(1)
+        stop.set()
+        await prober
+
+        busy: list[float] = []
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(client, stop, busy))
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post("/auth/token", data={"username" : "storm", "password" : "hunter2"})
+            for _ in range(logins)
+        ))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await prober
+
+    statuses = {}
+    for response in responses:
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    print(f"mode: {'inline bcrypt' if inline else f'pool of {auth.PASSWD_WORKERS}, queue {auth.PASSWD_QUEUE_SIZE}'}")
+    print(f"logins: {logins} in {elapsed:.2f}s, statuses {dict(sorted(statuses.items()))}")
+    for name, latencies in (("idle", idle), ("during storm", busy)):
+        ms = np.array(latencies) * 1000
+        print(f"GET / {name}: n={len(ms)} p50={np.percentile(ms, 50):.1f}ms p99={np.percentile(ms, 99):.1f}ms max={ms.max():.1f}ms")
+    if not inline:
+        # Every slot must be back once the pool drains, timed-out jobs included.
+        await asyncio.to_thread(auth.passwd_executor.shutdown, wait=True)
+        await asyncio.sleep(0)
+        print(f"free password slots after the storm: {auth.passwd_slots._value}/{auth.PASSWD_WORKERS + auth.PASSWD_QUEUE_SIZE}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--inline", action="store_true")
+    arguments = parser.parse_args()
+    asyncio.run(storm(arguments.logins, arguments.inline))
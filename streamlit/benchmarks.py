@@ -1,3 +1,5 @@
+import numpy as np
+
 def match(score, array):
     closest_index = 0
     for idx, elem in enumerate(array):
@@ -15,6 +17,84 @@ class Benchmark:
     def __init__(self, thresholds, energy_thresholds):
         self.thresholds = thresholds
         self.energy_thresholds = energy_thresholds
+        self._compile()
+
+    def _compile(self):
+        # Per-hash lookup tables for get_energies: row h, column i holds what `match` and
+        # `choose(i, ...)` produce in get_energy for hash h. Column 0 (no match) scores 0.
+        e1, e2, e3, e4 = self.energy_thresholds
+        previous_energy = e1 - 100
+        self.max_energy = e4 + 99
+
+        self.hashes = list(self.thresholds.keys())
+        n_hashes, width = len(self.hashes), 6
+        # NaN never compares <= to a score, so shorter (novice) match arrays stop matching there.
+        self._match = np.full((n_hashes, width), np.nan)
+        self._base = np.zeros((n_hashes, width + 1))
+        self._anchor = np.zeros((n_hashes, width + 1))
+        self._denominator = np.zeros((n_hashes, width + 1))
+        self._factor = np.zeros((n_hashes, width + 1))
+
+        for h, hash_ in enumerate(self.hashes):
+            t1, t2, t3, t4 = self.thresholds[hash_]
+            if e1 == 100: # Novice
+                match_array = [0, t1, t2, t3, t4]
+                base = [previous_energy, e1, e2, e3, e4]
+                anchor = [0, t1, t2, t3, t4]
+                denominator = [t1, t2 - t1, t3 - t2, t4 - t3, t4 - t3]
+                factor = [e1, e2 - e1, e3 - e2, e4 - e3, e4 - e3]
+            else: # Intermediate and Advanced
+                match_array = [0, t1 - (t2 - t1), t1, t2, t3, t4]
+                base = [0, previous_energy, e1, e2, e3, e4]
+                anchor = [0, t1 - (t2 - t1), t1, t2, t3, t4]
+                denominator = [t1 - (t2 - t1), t2 - t1, t2 - t1, t3 - t2, t4 - t3, t4 - t3]
+                factor = [previous_energy, e1 - previous_energy, e2 - e1, e3 - e2, e4 - e3, e4 - e3]
+            n = len(match_array)
+            self._match[h, :n] = match_array
+            self._base[h, 1:n + 1] = base
+            self._anchor[h, 1:n + 1] = anchor
+            self._denominator[h, 1:n + 1] = denominator
+            self._factor[h, 1:n + 1] = factor
+
+    def hash_codes(self, hashes):
+        """Maps hashes to the row codes get_energies expects."""
+        hashes = np.asarray(hashes, dtype=str)
+        order = np.argsort(self.hashes)
+        known = np.asarray(self.hashes, dtype=str)[order]
+        positions = np.searchsorted(known, hashes).clip(0, len(known) - 1)
+        unknown = known[positions] != hashes
+        if unknown.any():
+            raise KeyError(f"Unknown hashes: {sorted(set(hashes[unknown].tolist()))}")
+        return order[positions]
+
+    def get_energies(self, scores, hash_codes):
+        """Vectorised get_energy: scores and hash codes (see hash_codes) broadcast together.
+
+        Gives the same values as calling get_energy element by element.
+        """
+        scores = np.asarray(scores, dtype=float)
+        codes = np.asarray(hash_codes, dtype=np.intp)
+        shape = np.broadcast_shapes(scores.shape, codes.shape)
+        scores = np.broadcast_to(scores, shape).ravel()
+        codes = np.broadcast_to(codes, shape).ravel()
+
+        # Same as `match`: the number of leading entries of the match array <= score.
+        match_idx = np.zeros(scores.shape, dtype=np.intp)
+        matching = np.ones(scores.shape, dtype=bool)
+        for column in range(self._match.shape[1]):
+            matching &= self._match[codes, column] <= scores
+            match_idx += matching
+
+        base = self._base[codes, match_idx]
+        adjustment = scores - self._anchor[codes, match_idx]
+        denominator = self._denominator[codes, match_idx]
+        factor = self._factor[codes, match_idx]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result = base + (adjustment / denominator) * factor
+        result = np.where(result > self.max_energy, self.max_energy, result)
+        result = np.where((match_idx == 0) | (denominator == 0), 0.0, result)
+        return result.reshape(shape)
 
     def get_energy(self, score, hash_):
         t1, t2, t3, t4 = self.thresholds[hash_]
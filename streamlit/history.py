@@ -0,0 +1,69 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import Benchmark
+
+HOUR_NS = 3_600 * 1_000_000_000
+DAY_NS = 24 * HOUR_NS
+
+def local_days(ctime):
+    """Local calendar day (days since the epoch) of nanosecond timestamps, as datetime.fromtimestamp sees them.
+
+    The UTC offset is looked up once per distinct hour rather than once per run.
+    """
+    ctime = np.asarray(ctime, dtype=np.int64)
+    hours, inverse = np.unique(ctime // HOUR_NS, return_inverse=True)
+    offsets = np.array([time.localtime(hour * 3_600).tm_gmtoff for hour in hours.tolist()], dtype=np.int64)
+    return (ctime + offsets[inverse] * 1_000_000_000) // DAY_NS
+
+def energy_progress(df, benchmark: Benchmark, categories):
+    """Best energy reached in each category by the end of every day, from the first day all categories have one.
+
+    `df` holds a run per row with `hash`, `score` and `ctime` (nanoseconds). Benchmark scenarios are
+    taken in order, as many per category. Returns None until every benchmark scenario has a run.
+    """
+    hashes = pd.Categorical(df["hash"])
+    position = {hash_ : i for i, hash_ in enumerate(benchmark.hashes)}
+    dictionary_positions = np.array([position.get(hash_, -1) for hash_ in hashes.categories], dtype=np.intp)
+    positions = np.where(hashes.codes >= 0, dictionary_positions[hashes.codes], -1)
+    known = positions >= 0
+    positions = positions[known]
+    if len(np.unique(positions)) < len(benchmark.hashes):
+        return None
+
+    # Energy grows with the score, so the best energy of a day is the energy of its best score.
+    scenarios_per_category = len(benchmark.hashes) // len(categories)
+    energies = benchmark.get_energies(np.asarray(df["score"], dtype=float)[known], benchmark.hash_codes(benchmark.hashes)[positions])
+    daily = (
+        pd.DataFrame({"day" : local_days(np.asarray(df["ctime"])[known]), "category" : positions // scenarios_per_category, "energy" : energies})
+        .groupby(["day", "category"])["energy"].max()
+        .unstack("category")
+    )
+    # Days without a run in a category carry its best so far.
+    daily = daily.reindex(np.arange(daily.index.min(), daily.index.max() + 1)).cummax().ffill().dropna()
+    daily.index = pd.to_datetime(daily.index, unit="D")
+    daily.columns = list(categories)
+    return daily
+
+def downsample(series, budget):
+    """At most `budget` points of `series` for plotting, keeping the first and last points and every bucket's extremes.
+
+    Points are split into equal buckets of consecutive values; each bucket keeps its lowest and
+    highest point, so peaks and dips survive and the line keeps its shape. The budget must leave
+    room for those four points.
+    """
+    if budget < 4:
+        raise ValueError(f"A point budget of {budget} cannot hold the first and last points and the extremes.")
+    n = len(series)
+    if n <= budget:
+        return series
+    buckets = max(1, (budget - 2) // 2)
+    edges = np.linspace(0, n, buckets + 1).astype(np.intp)
+    bucket = np.repeat(np.arange(buckets), np.diff(edges))
+    values = np.asarray(series, dtype=float)
+    # Sorted by bucket, then value: each bucket's lowest point opens its run, its highest closes it.
+    order = np.lexsort((values, bucket))
+    lowest, highest = order[edges[:-1]], order[edges[1:] - 1]
+    return series.iloc[np.unique(np.concatenate(([0, n - 1], lowest, highest)))]
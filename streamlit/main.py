@@ -1,7 +1,8 @@
 import os
 import streamlit as st
 import requests
-import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 
 import pandas as pd
 import numpy as np
@@ -10,6 +11,8 @@ import plotly.express as px
 import plotly.graph_objects as go
 
 from benchmarks import Benchmark
+from history import energy_progress, downsample
+from store import EntryStore
 
 API_URL = "http://127.0.0.1:8000"# "https://chubby-krystyna-cuicuidev-da9ab1a9.koyeb.app"
 
@@ -17,6 +20,65 @@ BENCHMARK_CATEGORIES = ["Dynamic", "Static", "Linear", "Precise", "Reactive", "C
 
 PLOTLY_COLOR_ACCENT=["rgb(255, 0, 255)", "rgb(255, 55, 255)", "rgb(255, 101, 255)"]
 
+SEASON = 5
+DIFFICULTIES = ["novice", "intermediate", "advanced"]
+
+# Two requests per tab, all in flight at once over kept-alive connections.
+FETCH_WORKERS = 2 * len(DIFFICULTIES)
+REQUEST_TIMEOUT = (3.05, 30) # (connect, read) seconds
+
+# Fetched and derived data is reused until the user's next sync, or for this many seconds.
+DATA_CACHE_TTL = 600
+
+INSTALLER_PATH = "streamlit/kovaaks_tracker_tool_setup.exe"
+
+# Line charts send at most this many points to the browser (peaks, dips and the last point are kept).
+CHART_POINT_BUDGET = int(os.environ.get("CHART_POINT_BUDGET", 1_000))
+
+class FetchError(Exception):
+    pass
+
+@st.cache_resource
+def http_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=FETCH_WORKERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def fetch_executor():
+    return ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch")
+
+@st.cache_resource
+def load_installer(path):
+    # Read once per process rather than on every rerun.
+    with open(path, "br") as file:
+        return file.read()
+
+# Underscored arguments are not part of the cache key; `revision` moves with every insert of the user's.
+# Failures raise instead of returning, so they are not cached.
+
+@st.cache_data(ttl=DATA_CACHE_TTL, show_spinner=False)
+def load_energy_progress(_session, token, username, season, difficulty, revision):
+    # Only runs from the newest stored one on are downloaded, then merged into the user's local store.
+    store = EntryStore(username)
+    key = f"vt-s{season}-{difficulty}"
+    date_query, full = store.date_query(key)
+    data = get_json(_session, f"/entry/me/{key}/{date_query}", token, {}, params={"format" : "columns", "fields" : "id,hash,score,ctime"})
+    if data is None:
+        raise FetchError(f"/entry/me/{key}/{date_query}")
+    store.merge(key, columns_to_frame(data), full)
+    benchmark = Benchmark(thresholds=data["thresholds"], energy_thresholds=data["energy_thresholds"])
+    return energy_progress(store.frame(key), benchmark, BENCHMARK_CATEGORIES), data["energy_thresholds"]
+
+@st.cache_data(ttl=DATA_CACHE_TTL, show_spinner=False)
+def load_energy_position(_session, _responses, token, season, difficulty, revision):
+    position = get_json(_session, f"/entry/me/energy-distribution/vt-s{season}-{difficulty}", token, _responses)
+    if position is None:
+        raise FetchError(f"/entry/me/energy-distribution/vt-s{season}-{difficulty}")
+    return position
+
 def main():
 
     st.set_page_config(layout="wide", page_title="Aimalytics")
@@ -34,106 +96,77 @@ def main():
         st.title(f'Aimalytics for _**{st.session_state['username']}**_')
     st.sidebar.write("### Download")
 
-    file_path = "streamlit/kovaaks_tracker_tool_setup.exe"
-
     try:
-        with open(file_path, "br") as file:
-            file_content = file.read()
-            st.sidebar.download_button(
-                label="Windows x64",
-                data=file_content,
-                file_name=os.path.basename(file_path),
-                mime="application/octet-stream"
-            )
+        st.sidebar.download_button(
+            label="Windows x64",
+            data=load_installer(INSTALLER_PATH),
+            file_name=os.path.basename(INSTALLER_PATH),
+            mime="application/octet-stream"
+        )
     except FileNotFoundError:
-        st.sidebar.error(f"Error: Setup file not found at path: {file_path}")
+        st.sidebar.error(f"Error: Setup file not found at path: {INSTALLER_PATH}")
     except Exception as e:
         st.sidebar.error(f"An error occurred: {e}")
 
     authenticate()
 
     if st.session_state["access_token"]:
-        nov, int_, adv =  st.tabs(["VT Season 5 Novice", "VT Season 5 Intermediate", "VT Season 5 Advanced"])
-        show_season(nov, 5, "novice")
-        show_season(int_, 5, "intermediate")
-        show_season(adv, 5, "advanced")
+        tabs = st.tabs([f"VT Season {SEASON} {difficulty.capitalize()}" for difficulty in DIFFICULTIES])
+        show_seasons(dict(zip(DIFFICULTIES, tabs)), SEASON)
         st.sidebar.write("---")        
 
-def show_season(anchor, season, difficulty):
-    response = requests.get(f"{API_URL}/entry/me/vt-s{season}-{difficulty}/all", headers={"Authorization" : f"Bearer {st.session_state['access_token']}"})
-    
-    if response.status_code != 200:
-        anchor.warning("Unable to retrieve data.")
-        return
-    
-    try:
-        data = response.json()
-        entries = data["entries"]
-        thresholds = data["thresholds"]
-        energy_thresholds = data["energy_thresholds"]
-        del data
-    except:
-        anchor.warning("Unable to retrieve data.")
-        return
-    
-    if not len(set([entry["hash"] for entry in entries if entry["hash"] in thresholds.keys()])) == len(thresholds.keys()):
+def show_seasons(anchors, season):
+    # Every tab's requests go out together; a tab is drawn as soon as both of its responses are in.
+    token, username = st.session_state["access_token"], st.session_state["username"]
+    responses = st.session_state.setdefault("responses", {})
+    session, executor = http_session(), fetch_executor()
+    revision = get_json(session, "/me/sync-revision", token, responses)
+    futures = {
+        difficulty : (
+            executor.submit(load_energy_progress, session, token, username, season, difficulty, revision),
+            executor.submit(load_energy_position, session, responses, token, season, difficulty, revision),
+        )
+        for difficulty in anchors
+    }
+    pending = {future : difficulty for difficulty, pair in futures.items() for future in pair}
+    shown = set()
+    for future in as_completed(pending):
+        difficulty = pending[future]
+        if difficulty in shown or not all(other.done() for other in futures[difficulty]):
+            continue
+        shown.add(difficulty)
+        try:
+            (df_energy_cummax, energy_thresholds), position = (other.result() for other in futures[difficulty])
+        except Exception:
+            anchors[difficulty].warning("Unable to retrieve data.")
+            continue
+        show_season(anchors[difficulty], df_energy_cummax, energy_thresholds, position)
+
+def show_season(anchor, df_energy_cummax, energy_thresholds, position):
+    if df_energy_cummax is None:
         anchor.warning("Not enough data.")
         return
-    
-    # Processing
-    benchmark = Benchmark(thresholds=thresholds, energy_thresholds=energy_thresholds)
-
-    df = pd.DataFrame(entries)
-    df.loc[:,"ctime"] = df["ctime"].apply(lambda x: datetime.datetime.fromtimestamp(float(x)/1_000_000_000))
-
-    # Get the daily max score
-    dfs = []
-    for hash_ in benchmark.thresholds.keys():
-        df_ = df[df["hash"] == hash_]
-        scores_series = df_.set_index(df_["ctime"]).resample("D")["score"].max().apply(lambda x: benchmark.get_energy(x, hash_))
-        scores_series.name = df_["scenario"].dropna().unique()[0]
-        dfs.append(scores_series)
-        
-    df__ = pd.concat(dfs, axis=1).interpolate("linear")
-    del dfs
-
-    # Get the cumsum of the daily max score
-    series = []
-    for col_pair in np.reshape(df__.columns, shape=(9,2)):
-        df_bench = df__[col_pair]
-        serie = parse_pair(df_bench)
-        series.append(serie)
-    del df__
-        
-    df_energy_cummax = pd.concat(series, axis=1).dropna()
-    fig_energy_progress = px.line(x=df_energy_cummax.index, y=stats.hmean(df_energy_cummax,axis=1), height=400, color_discrete_sequence=PLOTLY_COLOR_ACCENT)
+
+    progress = downsample(pd.Series(stats.hmean(df_energy_cummax, axis=1), index=df_energy_cummax.index), CHART_POINT_BUDGET)
+    fig_energy_progress = px.line(x=progress.index, y=progress.values, height=400, color_discrete_sequence=PLOTLY_COLOR_ACCENT)
 
     # All time max score for radar graph
     max_ = df_energy_cummax.max(axis=0)
     fig_radar = px.line_polar(theta=BENCHMARK_CATEGORIES, r=max_.values, line_close=True, range_r=[energy_thresholds[0] - 100, energy_thresholds[-1] + 100], color_discrete_sequence=PLOTLY_COLOR_ACCENT)
     fig_radar.update_layout(polar=dict(bgcolor = "rgba(0.0, 0.0, 0.0, 0.0)"))
 
-    # Synthetic data as a placeholder
-    percentile_data = requests.get(API_URL + f"/entry/percentiles/vt-s{season}-{difficulty}", headers={"Authorization" : f"Bearer {st.session_state['access_token']}"})
-    percentiles_df = pd.DataFrame({k : [row["score"] for row in v] for k, v in percentile_data.json().items()}, index=range(1,101)).reset_index()
-    percentiles_df = percentiles_df.drop(["index"], axis=1)
-
-    percentiles = []
-
-    for row in percentiles_df.iloc:
-        energies = {hash_ : benchmark.get_energy(score, hash_) for hash_, score in row.to_dict().items()}
-        pairs = [max(energy_a, energy_b) for energy_a, energy_b in zip(list(energies.values())[::2], list(energies.values())[1::2])]
-        percentiles.append(stats.hmean(pairs))        
+    # Population energy distribution, precomputed by the API
+    distribution = position["distribution"]
+    edges = np.array(distribution["edges"])
+    centers = (edges[:-1] + edges[1:]) / 2
 
     # Histogram to compare with the population
-    pdf = stats.gaussian_kde(percentiles)
-    # fig_histogram = px.line(pdf.pdf(np.linspace(-100, energy_thresholds[-1] + 100, 1000))*100, color_discrete_sequence=PLOTLY_COLOR_ACCENT)
-    fig_histogram = px.line(percentiles, color_discrete_sequence=PLOTLY_COLOR_ACCENT)
+    fig_histogram = px.line(x=centers, y=distribution["density"], color_discrete_sequence=PLOTLY_COLOR_ACCENT)
 
-    energy = stats.hmean(df_energy_cummax.max(axis=0))
+    energy = position["energy"]
     trace = go.Scatter(
         x=[energy, energy],
-        y=[0,.75],
+        y=[0, max(distribution["density"], default=0)],
         mode="lines"
     )
     fig_histogram.add_trace(trace)
@@ -151,8 +184,7 @@ def authenticate():
         password = st.sidebar.text_input("Password", type="password")
 
         if st.sidebar.button("Sign in"):
-            response = requests.post(f"{API_URL}/auth/token", data={"username" : username, "password" : password, "grant_type" : "password",})
-            print(response.text)
+            response = http_session().post(f"{API_URL}/auth/token", data={"username" : username, "password" : password, "grant_type" : "password",}, timeout=REQUEST_TIMEOUT)
             if response.status_code == 200:
                 st.session_state["access_token"] = response.json()["access_token"]
                 st.session_state["username"] = username
@@ -163,9 +195,33 @@ def authenticate():
             st.session_state["access_token"] = None
             st.rerun()
 
-def parse_pair(df):
-    series = df.max(axis=1)
-    return series.cummax()
+def get_json(session, path, token, responses, params=None):
+    # Revalidates the body kept from the previous run: unchanged data comes back as a bodiless 304.
+    # Runs on the fetch threads, so nothing here touches st.session_state.
+    key = (path, tuple(sorted((params or {}).items())))
+    headers = {"Authorization" : f"Bearer {token}"}
+    if key in responses:
+        headers["If-None-Match"] = responses[key][0]
+
+    try:
+        response = session.get(API_URL + path, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException:
+        return None
+    if response.status_code == 304:
+        return responses[key][1]
+    if response.status_code != 200:
+        return None
+    data = response.json()
+    if "ETag" in response.headers:
+        responses[key] = response.headers["ETag"], data
+    return data
+
+def columns_to_frame(data):
+    # Columnar responses send repeated strings as a dictionary plus a code per row.
+    return pd.DataFrame({
+        name : pd.Categorical.from_codes(values, data["dictionaries"][name]) if name in data["dictionaries"] else values
+        for name, values in data["columns"].items()
+    })
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,82 @@
+import os
+import time
+import sqlite3
+import hashlib
+import datetime
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+STORE_DIR = os.environ.get("AIMALYTICS_STORE_DIR", os.path.join(os.path.dirname(__file__), ".store"))
+
+# Runs uploaded out of order (older than the newest stored run) are only seen by a full download.
+FULL_SYNC_SECONDS = float(os.environ.get("AIMALYTICS_FULL_SYNC_SECONDS", 24 * 3600))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS run (
+    benchmark TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    score REAL,
+    ctime INTEGER NOT NULL,
+    PRIMARY KEY (benchmark, id)
+);
+CREATE TABLE IF NOT EXISTS sync (
+    benchmark TEXT PRIMARY KEY,
+    full_synced_at REAL NOT NULL
+);
+"""
+
+class EntryStore:
+    """The runs already downloaded for one user, kept in a SQLite file so reloads only fetch newer ones.
+
+    Runs are stored per benchmark ("vt-s5-novice") and deduplicated by id.
+    """
+
+    def __init__(self, username):
+        os.makedirs(STORE_DIR, exist_ok=True)
+        self.path = os.path.join(STORE_DIR, hashlib.sha1(username.encode()).hexdigest()[:16] + ".sqlite")
+        with self.connect() as connection, connection:
+            connection.executescript(SCHEMA)
+
+    def connect(self):
+        # One connection per call: the dashboard syncs its tabs from several threads.
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return closing(connection)
+
+    def date_query(self, benchmark):
+        """The entry date query that brings the store up to date, and whether it downloads everything."""
+        with self.connect() as connection:
+            synced = connection.execute("SELECT full_synced_at FROM sync WHERE benchmark = ?", (benchmark,)).fetchone()
+            latest = connection.execute("SELECT MAX(ctime) FROM run WHERE benchmark = ?", (benchmark,)).fetchone()[0]
+        if synced is None or latest is None or time.time() - synced[0] > FULL_SYNC_SECONDS:
+            return "all", True
+        # The API reads dates in its own time zone: starting a day early keeps the newest runs covered.
+        since = datetime.datetime.fromtimestamp(latest / 1_000_000_000) - datetime.timedelta(days=1)
+        return f"{since:%d-%m-%Y}..", False
+
+    def merge(self, benchmark, runs, full):
+        """Adds downloaded runs (a frame with id, hash, score and ctime); a full download replaces the stored ones."""
+        rows = zip(runs["id"].tolist(), runs["hash"].astype(str).tolist(), runs["score"].tolist(), runs["ctime"].tolist())
+        with self.connect() as connection, connection:
+            if full:
+                connection.execute("DELETE FROM run WHERE benchmark = ?", (benchmark,))
+            connection.executemany(
+                "INSERT OR REPLACE INTO run (benchmark, id, hash, score, ctime) VALUES (?, ?, ?, ?, ?)",
+                ((benchmark, *row) for row in rows),
+            )
+            if full:
+                connection.execute("INSERT OR REPLACE INTO sync (benchmark, full_synced_at) VALUES (?, ?)", (benchmark, time.time()))
+
+    def frame(self, benchmark):
+        """Every stored run of the benchmark, in ctime order."""
+        with self.connect() as connection:
+            rows = connection.execute("SELECT hash, score, ctime FROM run WHERE benchmark = ? ORDER BY ctime, id", (benchmark,)).fetchall()
+        hashes, scores, ctimes = zip(*rows) if rows else ((), (), ())
+        return pd.DataFrame({
+            "hash" : pd.Categorical(hashes),
+            "score" : np.array(scores, dtype=float),
+            "ctime" : np.array(ctimes, dtype=np.int64),
+        })
@@ -0,0 +1,30 @@
+import os
+import sys
+import types
+import importlib
+
+import pytest
+
+# The API modules import each other by their flat names and need a database URL to load.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "api"))
+
+DASHBOARD_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "streamlit")
+DASHBOARD_MODULES = ("benchmarks", "history", "store")
+
+@pytest.fixture(scope="session")
+def dashboard():
+    """The dashboard's modules (streamlit/), as attributes.
+
+    They share flat names with API modules (benchmarks), so they are imported with the API
+    modules of the same name set aside, then removed again from sys.modules.
+    """
+    shadowed = {name : sys.modules.pop(name) for name in DASHBOARD_MODULES if name in sys.modules}
+    sys.path.insert(0, DASHBOARD_DIR)
+    try:
+        return types.SimpleNamespace(**{name : importlib.import_module(name) for name in DASHBOARD_MODULES})
+    finally:
+        sys.path.remove(DASHBOARD_DIR)
+        for name in DASHBOARD_MODULES:
+            sys.modules.pop(name, None)
+        sys.modules.update(shadowed)
@@ -0,0 +1,42 @@
+import asyncio
+import datetime
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from auth import user_cache
+from database import engine, create_db_and_tables, User
+
+def test_cached_user_is_dropped_on_commit_only():
+    async def main():
+        await create_db_and_tables()
+        now = datetime.datetime.now(datetime.UTC)
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            user = User(username="cached", email="cached@example.com", hashed_passwd="", created_at=now, updated_at=now)
+            session.add(user)
+            await session.commit()
+        user_cache.set("cached", user)
+
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            stored = await session.get(User, user.id)
+            stored.is_active = False
+            await session.flush()
+            flushed = user_cache.get("cached")
+            await session.rollback()
+        rolled_back = user_cache.get("cached")
+
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            stored = await session.get(User, user.id)
+            stored.username = "renamed"
+            await session.flush()
+            renamed_flushed = user_cache.get("cached")
+            user_cache.set("renamed", stored)
+            await session.commit()
+        return flushed, rolled_back, renamed_flushed, user_cache.get("cached"), user_cache.get("renamed")
+
+    flushed, rolled_back, renamed_flushed, old_name, new_name = asyncio.run(main())
+
+    assert flushed is not None
+    assert rolled_back is not None
+    assert renamed_flushed is not None
+    assert old_name is None
+    assert new_name is None
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from benchmarks import all_benchmarks
+
+REGISTRY = {f"{b.family}-s{b.season}-{b.difficulty}" : b for b in all_benchmarks()}
+
+@pytest.fixture(params=sorted(REGISTRY))
+def benchmark(request, dashboard):
+    # Built from the API's data, as the dashboard builds it from /benchmarks.
+    spec = REGISTRY[request.param]
+    return dashboard.benchmarks.Benchmark(thresholds=spec.thresholds, energy_thresholds=spec.energy_thresholds)
+
+def edge_scores(thresholds) -> list[float]:
+    """Scores at, just around and between every breakpoint of one scenario, and far outside them."""
+    t1, t2, t3, t4 = thresholds
+    breakpoints = [0, t1 - (t2 - t1), t1, t2, t3, t4]
+    scores = [-1e9, -1.0, 0.5 * t1, t4 + 0.5 * (t4 - t3), 10 * t4, 1e12, np.nan]
+    for breakpoint in breakpoints:
+        scores += [breakpoint - 1e-9, breakpoint, breakpoint + 1e-9, breakpoint + 0.37]
+    return scores
+
+def test_get_energies_matches_get_energy(benchmark):
+    rng = np.random.default_rng(0)
+    scores, hashes = [], []
+    for hash_, thresholds in benchmark.thresholds.items():
+        for score in [*edge_scores(thresholds), *rng.uniform(-0.2 * thresholds[3], 1.5 * thresholds[3], 200)]:
+            scores.append(score)
+            hashes.append(hash_)
+
+    energies = benchmark.get_energies(scores, benchmark.hash_codes(hashes))
+
+    expected = [benchmark.get_energy(score, hash_) for score, hash_ in zip(scores, hashes)]
+    np.testing.assert_array_equal(energies, expected)
+
+def test_get_energies_edges(benchmark):
+    codes = np.arange(len(benchmark.hashes))
+    e1, _, _, e4 = benchmark.energy_thresholds
+
+    below = benchmark.get_energies(np.full(len(codes), -1.0), codes)
+    above = benchmark.get_energies(np.full(len(codes), 1e12), codes)
+    missing = benchmark.get_energies(np.full(len(codes), np.nan), codes)
+
+    np.testing.assert_array_equal(below, 0.0)
+    np.testing.assert_array_equal(above, e4 + 99)
+    np.testing.assert_array_equal(missing, 0.0)
+
+def test_get_energies_broadcasts(benchmark):
+    scores = np.linspace(0, 2_000, 12).reshape(3, 4)
+    codes = benchmark.hash_codes(benchmark.hashes[:4])
+
+    energies = benchmark.get_energies(scores, codes)
+
+    assert energies.shape == (3, 4)
+    np.testing.assert_array_equal(energies[:, 1], [benchmark.get_energy(score, benchmark.hashes[1]) for score in scores[:, 1]])
+
+def test_hash_codes(benchmark):
+    hashes = benchmark.hashes[::-1] + benchmark.hashes[:1]
+
+    codes = benchmark.hash_codes(hashes)
+
+    assert [benchmark.hashes[code] for code in codes] == hashes
+    with pytest.raises(KeyError, match="unknown-hash"):
+        benchmark.hash_codes([benchmark.hashes[0], "unknown-hash"])
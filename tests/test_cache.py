@@ -0,0 +1,177 @@
+import time
+import asyncio
+import types
+
+import pytest
+
+import cache
+from cache import TTLCache, LocalBackend, RedisBackend, ResponseCache
+
+class FakeRedis:
+    """Stand-in for a redis.asyncio client: the get/set/delete subset the backend uses."""
+
+    def __init__(self):
+        self.values: dict[str, tuple[float, bytes]] = {}
+
+    async def get(self, key):
+        item = self.values.get(key)
+        if item is None or item[0] < time.monotonic():
+            return None
+        return item[1]
+
+    async def set(self, key, value, px):
+        self.values[key] = (time.monotonic() + px / 1000, value)
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+
+class FailingBackend:
+    async def get(self, key):
+        raise ConnectionError("down")
+
+    async def set(self, key, value):
+        raise ConnectionError("down")
+
+def counting(value: bytes, delay: float = 0.0):
+    calls = []
+    async def compute():
+        calls.append(None)
+        await asyncio.sleep(delay)
+        return value
+    return compute, calls
+
+def test_ttl_cache_bounds_bytes():
+    entries = TTLCache(maxsize=100, ttl=60, maxbytes=10)
+    entries.set("a", b"1234")
+    entries.set("b", b"1234")
+    entries.set("c", b"1234")
+
+    assert entries.get("a") is None
+    assert entries.nbytes == 8
+    assert entries.evictions == 1
+
+    entries.set("b", b"12")
+    assert entries.nbytes == 6
+    entries.pop("c")
+    assert entries.nbytes == 2
+    entries.clear()
+    assert entries.nbytes == 0
+
+def test_ttl_cache_expires_and_bounds_entries():
+    entries = TTLCache(maxsize=2, ttl=0.01)
+    entries.set("a", 1)
+    entries.set("b", 2)
+    entries.get("a")
+    entries.set("c", 3)
+
+    assert entries.get("b") is None # Least recently used
+    assert entries.get("a") == 1
+    time.sleep(0.02)
+    assert entries.get("a") is None
+    assert len(entries) == 1
+
+def test_oversized_values_are_served_but_not_stored():
+    responses = ResponseCache(LocalBackend(maxsize=10, ttl=60, maxbytes=1_000), max_entry_bytes=4)
+    compute, calls = counting(b"12345")
+
+    async def main():
+        return [await responses.get_or_compute("k", compute) for _ in range(2)]
+
+    assert asyncio.run(main()) == [b"12345", b"12345"]
+    assert len(calls) == 2
+    assert responses.oversized == 2
+    assert len(responses.backend.entries) == 0
+
+def test_concurrent_misses_compute_once():
+    responses = ResponseCache(LocalBackend(maxsize=10, ttl=60, maxbytes=1_000), max_entry_bytes=100)
+    compute, calls = counting(b"value", delay=0.01)
+
+    async def main():
+        return await asyncio.gather(*(responses.get_or_compute("k", compute) for _ in range(10)))
+
+    assert asyncio.run(main()) == [b"value"] * 10
+    assert len(calls) == 1
+    assert responses.stats() | {"hit_rate" : None} == {
+        "backend" : "LocalBackend", "hits" : 0, "misses" : 1, "coalesced" : 9,
+        "errors" : 0, "oversized" : 0, "inflight" : 0, "hit_rate" : None,
+    }
+
+def test_cancelled_leader_hands_over_to_a_waiter():
+    responses = ResponseCache(LocalBackend(maxsize=10, ttl=60, maxbytes=1_000), max_entry_bytes=100)
+    compute, calls = counting(b"value", delay=0.05)
+
+    async def main():
+        leader = asyncio.create_task(responses.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(responses.get_or_compute("k", compute)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*waiters)
+
+    assert asyncio.run(main()) == [b"value"] * 3
+    assert len(calls) == 2
+    assert responses.inflight == {}
+
+def test_cancelled_waiter_does_not_disturb_the_leader():
+    responses = ResponseCache(LocalBackend(maxsize=10, ttl=60, maxbytes=1_000), max_entry_bytes=100)
+    compute, calls = counting(b"value", delay=0.05)
+
+    async def main():
+        leader = asyncio.create_task(responses.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(responses.get_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await leader
+
+    assert asyncio.run(main()) == b"value"
+    assert len(calls) == 1
+
+def test_errors_reach_waiters_and_are_not_cached():
+    responses = ResponseCache(LocalBackend(maxsize=10, ttl=60, maxbytes=1_000), max_entry_bytes=100)
+    calls = []
+    async def compute():
+        calls.append(None)
+        await asyncio.sleep(0.01)
+        raise ValueError("broken")
+
+    async def main():
+        return await asyncio.gather(*(responses.get_or_compute("k", compute) for _ in range(3)), return_exceptions=True)
+
+    assert [type(result) for result in asyncio.run(main())] == [ValueError] * 3
+    assert len(calls) == 1
+    assert len(responses.backend.entries) == 0
+
+def test_failing_backend_degrades_to_recomputing():
+    responses = ResponseCache(FailingBackend(), max_entry_bytes=100)
+    compute, calls = counting(b"value")
+
+    async def main():
+        return [await responses.get_or_compute("k", compute) for _ in range(2)]
+
+    assert asyncio.run(main()) == [b"value", b"value"]
+    assert len(calls) == 2
+    assert responses.errors == 4
+
+def test_redis_backend(monkeypatch):
+    client = FakeRedis()
+    monkeypatch.setattr(cache, "redis", types.SimpleNamespace(from_url=lambda url: client))
+    responses = ResponseCache(RedisBackend("redis://cache", ttl=60, prefix="test:"), max_entry_bytes=100)
+    compute, calls = counting(b"value")
+
+    async def main():
+        first = await responses.get_or_compute("k", compute)
+        second = await responses.get_or_compute("k", compute)
+        responses.invalidate("k")
+        await asyncio.gather(*responses.backend.tasks)
+        third = await responses.get_or_compute("k", compute)
+        return first, second, third
+
+    assert asyncio.run(main()) == (b"value", b"value", b"value")
+    assert list(client.values) == ["test:k"]
+    assert len(calls) == 2
+    assert responses.hits == 1
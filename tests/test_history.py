@@ -0,0 +1,132 @@
+import os
+import time
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks import find_benchmark
+
+SPEC = find_benchmark("vt", 5, "novice")
+CATEGORIES = [name for name, _ in SPEC.categories]
+START = int(datetime.datetime(2024, 3, 20, tzinfo=datetime.UTC).timestamp()) * 10**9 # Spans the March DST change
+DAY = 86_400 * 10**9
+
+@pytest.fixture(params=["UTC", "Europe/Paris", "America/Los_Angeles"])
+def local_time(request):
+    previous = os.environ.get("TZ")
+    os.environ["TZ"] = request.param
+    time.tzset()
+    yield request.param
+    if previous is None:
+        del os.environ["TZ"]
+    else:
+        os.environ["TZ"] = previous
+    time.tzset()
+
+@pytest.fixture
+def benchmark(dashboard):
+    return dashboard.benchmarks.Benchmark(thresholds=SPEC.thresholds, energy_thresholds=SPEC.energy_thresholds)
+
+def previous_energy_progress(df, benchmark):
+    """The per-scenario pipeline show_season ran before energy_progress, kept as the reference."""
+    df = df.copy()
+    df["ctime"] = df["ctime"].apply(lambda x: datetime.datetime.fromtimestamp(float(x) / 1_000_000_000))
+    dfs = []
+    for hash_ in benchmark.thresholds.keys():
+        df_ = df[df["hash"] == hash_]
+        scores_series = df_.set_index(df_["ctime"]).resample("D")["score"].max().apply(lambda x: benchmark.get_energy(x, hash_))
+        scores_series.name = df_["scenario"].dropna().unique()[0]
+        dfs.append(scores_series)
+    df__ = pd.concat(dfs, axis=1, sort=True).interpolate("linear")
+    series = [df__[col_pair].max(axis=1).cummax() for col_pair in np.reshape(df__.columns, shape=(9, 2))]
+    return pd.concat(series, axis=1).dropna()
+
+def runs(rows) -> pd.DataFrame:
+    """A history frame from (scenario position, score, ctime) rows."""
+    positions, scores, ctimes = zip(*rows)
+    return pd.DataFrame({
+        "scenario" : pd.Categorical([SPEC.names[p] for p in positions]),
+        "hash" : pd.Categorical([SPEC.hashes[p] for p in positions]),
+        "score" : np.array(scores, dtype=float),
+        "ctime" : np.array(ctimes, dtype=np.int64),
+    })
+
+def random_history(rng, n_runs: int, days: int) -> pd.DataFrame:
+    # Few runs over many days: most days miss most scenarios and some categories go weeks without a run.
+    positions = rng.integers(len(SPEC.hashes), size=n_runs)
+    top = np.array([SPEC.thresholds[hash_][3] for hash_ in SPEC.hashes], dtype=float)
+    scores = rng.uniform(0.2, 1.3, n_runs) * top[positions]
+    ctimes = np.sort(START + rng.integers(days * DAY, size=n_runs))
+    return runs(zip(positions.tolist(), scores.tolist(), ctimes.tolist()))
+
+@pytest.mark.parametrize("n_runs, days", [(60, 30), (400, 120), (5_000, 400)])
+def test_matches_previous_pipeline(dashboard, benchmark, local_time, n_runs, days):
+    df = random_history(np.random.default_rng(n_runs), n_runs, days)
+
+    result = dashboard.history.energy_progress(df, benchmark, CATEGORIES)
+
+    expected = previous_energy_progress(df, benchmark)
+    expected.columns = CATEGORIES
+    pd.testing.assert_frame_equal(result, expected, check_freq=False, check_names=False, check_index_type=False)
+
+def test_runless_days_carry_the_best_so_far(dashboard, benchmark):
+    low = [(p, SPEC.thresholds[hash_][0], START + 3_600 * 10**9) for p, hash_ in enumerate(SPEC.hashes)]
+    df = runs(low + [
+        (0, SPEC.thresholds[SPEC.hashes[0]][2], START + 2 * DAY), # Better run, category 0
+        (2, 0.5 * SPEC.thresholds[SPEC.hashes[2]][0], START + 5 * DAY), # Worse run, category 1
+    ])
+
+    result = dashboard.history.energy_progress(df, benchmark, CATEGORIES)
+
+    assert len(result) == 6
+    assert not result.isna().any().any()
+    e1, _, e3, _ = SPEC.energy_thresholds
+    np.testing.assert_array_equal(result[CATEGORIES[0]], [e1, e1, e3, e3, e3, e3])
+    np.testing.assert_array_equal(result[CATEGORIES[1]], [e1] * 6)
+    assert (result.iloc[:, 2:] == e1).all().all()
+
+def test_starts_once_every_category_has_a_run(dashboard, benchmark):
+    first = [(p, SPEC.thresholds[hash_][1], START + p * DAY) for p, hash_ in enumerate(SPEC.hashes)]
+    df = runs(first)
+
+    result = dashboard.history.energy_progress(df, benchmark, CATEGORIES)
+
+    # Category i is complete once either of its scenarios has run: scenario 2 * 8 on day 16.
+    assert len(result) == 2
+    assert result.index[0] == pd.Timestamp(datetime.datetime.fromtimestamp((START + 16 * DAY) / 1e9).date())
+
+def test_incomplete_and_unknown_runs(dashboard, benchmark):
+    df = runs([(p, 1_000, START) for p in range(len(SPEC.hashes) - 1)])
+    assert dashboard.history.energy_progress(df, benchmark, CATEGORIES) is None
+
+    complete = runs([(p, 1_000, START) for p in range(len(SPEC.hashes))])
+    other = pd.DataFrame({"scenario" : ["Other"], "hash" : ["not-in-benchmark"], "score" : [1e9], "ctime" : [START + 3 * DAY]})
+    result = dashboard.history.energy_progress(pd.concat([complete, other], ignore_index=True), benchmark, CATEGORIES)
+    assert len(result) == 1
+
+@pytest.mark.parametrize("budget", [4, 5, 10, 101, 1_000])
+@pytest.mark.parametrize("n", [3, 4, 50, 999, 10_000])
+def test_downsample_keeps_budget_and_extremes(dashboard, budget, n):
+    rng = np.random.default_rng(n)
+    values = np.cumsum(rng.normal(0, 1, n))
+    values[n // 3] += 1_000 # A single-point peak
+    series = pd.Series(values, index=pd.date_range("2024-01-01", periods=n, freq="h"))
+
+    result = dashboard.history.downsample(series, budget)
+
+    assert len(result) <= budget
+    assert result.index.is_monotonic_increasing
+    assert result.index[0] == series.index[0]
+    assert result.index[-1] == series.index[-1]
+    assert result.iloc[-1] == series.iloc[-1]
+    assert result.max() == series.max()
+    assert result.min() == series.min()
+    pd.testing.assert_series_equal(result, series.loc[result.index])
+
+def test_downsample_rejects_budgets_below_four(dashboard):
+    series = pd.Series(np.arange(10.0))
+
+    with pytest.raises(ValueError):
+        dashboard.history.downsample(series, 3)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from sketch import TDigest
+
+LEVELS = np.array([0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 0.999])
+
+def rank_error(data: np.ndarray, digest: TDigest) -> float:
+    """Largest gap between a requested quantile level and the true rank of the digest's answer."""
+    ordered = np.sort(data)
+    estimates = digest.quantile(LEVELS)
+    ranks = np.searchsorted(ordered, estimates, side="right") / len(ordered)
+    return float(np.max(np.abs(ranks - LEVELS)))
+
+def merged_digest(data: np.ndarray, parts: int) -> TDigest:
+    # Built per part, serialized as the sketch rows are, then merged back together.
+    merged = TDigest()
+    for part in np.array_split(data, parts):
+        digest = TDigest()
+        for chunk in np.array_split(part, 10):
+            digest.add(chunk)
+        merged.merge(TDigest.from_bytes(digest.to_bytes()))
+    return merged
+
+@pytest.mark.parametrize("distribution", ["normal", "lognormal", "uniform", "bimodal"])
+def test_merged_digest_rank_error(distribution):
+    rng = np.random.default_rng(0)
+    data = {
+        "normal" : lambda: rng.normal(1_000, 150, 200_000),
+        "lognormal" : lambda: rng.lognormal(7, 0.6, 200_000),
+        "uniform" : lambda: rng.uniform(0, 5_000, 200_000),
+        "bimodal" : lambda: np.concatenate((rng.normal(500, 50, 120_000), rng.normal(2_000, 200, 80_000))),
+    }[distribution]()
+    rng.shuffle(data)
+
+    digest = merged_digest(data, parts=8)
+
+    assert digest.count == len(data)
+    assert rank_error(data, digest) < 5e-3
+    assert digest.quantile(0.0) == data.min()
+    assert digest.quantile(1.0) == data.max()
+
+def test_cdf_matches_exact_ranks():
+    rng = np.random.default_rng(1)
+    data = rng.normal(1_000, 150, 100_000)
+    digest = merged_digest(data, parts=4)
+
+    points = np.quantile(data, LEVELS)
+    exact = np.searchsorted(np.sort(data), points, side="right") / len(data)
+    assert np.max(np.abs(digest.cdf(points) - exact)) < 5e-3
+
+def test_round_trip_preserves_digest():
+    digest = TDigest()
+    digest.add(np.random.default_rng(2).exponential(300, 50_000))
+    restored = TDigest.from_bytes(digest.to_bytes())
+
+    assert restored.compression == digest.compression
+    assert restored.count == digest.count
+    np.testing.assert_array_equal(restored.quantile(LEVELS), digest.quantile(LEVELS))
+
+def test_empty_digest():
+    digest = TDigest()
+    assert np.isnan(digest.quantile(0.5))
+    assert np.isnan(digest.cdf(1_000.0))
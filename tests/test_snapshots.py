@@ -0,0 +1,24 @@
+import numpy as np
+
+from snapshots import interpolated_percentiles
+
+def percentile_cont(values: list[float], fraction: float) -> float:
+    # PostgreSQL's definition: linear interpolation at position fraction * (n - 1) of the sorted values.
+    ordered = sorted(values)
+    position = fraction * (len(ordered) - 1)
+    lower = int(np.floor(position))
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (position - lower) * (ordered[upper] - ordered[lower])
+
+def test_interpolated_percentiles_match_percentile_cont():
+    rng = np.random.default_rng(0)
+    scores = {"a" : rng.normal(1_000, 100, 537).tolist(), "b" : [42.0], "c" : [1.0, 3.0]}
+    rows = [(hash_, score) for hash_, values in scores.items() for score in values]
+    rng.shuffle(rows)
+
+    percentiles = interpolated_percentiles(rows)
+
+    assert sorted(percentiles) == ["a", "b", "c"]
+    for hash_, values in scores.items():
+        assert [row["percentile"] for row in percentiles[hash_]] == list(range(1, 101))
+        np.testing.assert_allclose([row["score"] for row in percentiles[hash_]], [percentile_cont(values, p / 100) for p in range(1, 101)])